@@ -1,17 +1,79 @@
 import os
 import json
-import asyncio
-import subprocess
+import time
 from typing import Dict, Any, List
-import requests
+from llm_client import get_client, MissingAPIKeyError
+from summarizer import RollupSummarizer
+from command_runner import get_process_pool
 
 # Import our base agent class
-from honeycomb import Agent, ContextDB
+from honeycomb import Agent, ContextDB, save_partial_result
 
-# You'll need to set your API keys as environment variables
-# or replace the os.environ.get calls with your actual keys
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
-ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
+# Streamed output is saved to the task's partial_result at most this often
+PARTIAL_FLUSH_SECONDS = 1.0
+
+# Default limits for command tasks; "timeout", "max_output_bytes" and
+# "max_output_lines" in the task params override them
+COMMAND_TIMEOUT_SECONDS = 600
+COMMAND_MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+
+
+# Task params that change how a task runs, not what it asks for
+RUN_PARAMS = ("bypass_cache", "cache_by_task", "stream", "partial_interval", "context_budget")
+
+
+def task_cache_inputs(task):
+    """What a "cache_by_task" task's completion is cached by: the task itself,
+    without the retrieved context, which differs on nearly every run."""
+    params = {name: value for name, value in task.get("params", {}).items() if name not in RUN_PARAMS}
+    upstream = {task_id: entry["result"] for task_id, entry in (task.get("upstream_results") or {}).items()}
+    return {"type": task.get("type"), "description": task.get("description"), "params": params,
+            "upstream": upstream}
+
+
+def upstream_section(task):
+    """Prompt section with the results of the tasks this one depends on."""
+    upstream = task.get("upstream_results")
+    if not upstream:
+        return ""
+    parts = []
+    for entry in upstream.values():
+        result = entry["result"]
+        if not isinstance(result, str):
+            result = json.dumps(result, indent=2)
+        parts.append(f"[{entry['type']}] {entry['description']}:\n{result}")
+    return "\nResults of the tasks this one builds on:\n" + "\n\n".join(parts) + "\n"
+
+
+async def complete_streaming(context_db, task, prompt, **kwargs):
+    """Stream a completion, keeping task["partial_result"] up to date.
+    
+    The first piece is written straight away so a tailing UI shows output
+    as early as possible; only the newest PARTIAL_RESULT_CHARS are stored,
+    and writes stop with LeaseLost once another worker owns the task. Set
+    "stream": false in the task params to wait for the whole answer
+    instead, or "partial_interval" to change how often partial output is
+    saved. The response is cached by the full prompt, so new context means a
+    fresh answer; with "cache_by_task": true it is cached by
+    task_cache_inputs(task) instead, and re-running the task hits the cache
+    even after new context has arrived.
+    """
+    params = task.get("params", {})
+    if params.get("cache_by_task"):
+        kwargs.setdefault("cache_inputs", task_cache_inputs(task))
+    if not params.get("stream", True):
+        return await get_client().complete(prompt, **kwargs)
+    
+    interval = params.get("partial_interval", PARTIAL_FLUSH_SECONDS)
+    parts = []
+    last_flush = None
+    async for delta in get_client().stream(prompt, **kwargs):
+        parts.append(delta)
+        now = time.monotonic()
+        if last_flush is None or now - last_flush >= interval:
+            save_partial_result(context_db, task, "".join(parts))
+            last_flush = now
+    return "".join(parts)
 
 
 class WritingAgent(Agent):
@@ -24,14 +86,15 @@ class WritingAgent(Agent):
         """Process a writing task using OpenAI's API."""
         description = task.get("description", "")
         params = task.get("params", {})
+        # Without a key the task fails (MissingAPIKeyError) rather than completing
+        get_client().require_key("openai")
         
         prompt = params.get("prompt", description)
         tone = params.get("tone", "professional")
         length = params.get("length", "medium")
         
-        # Fetch context to provide to the model
-        context_entries = self.context_db.get_latest_context(5)
-        context_text = "\n".join([entry.get("content", "") for entry in context_entries])
+        # The context most relevant to this task, within the prompt token budget
+        context_text = self.context_db.assembler.assemble(prompt, self.specialty, params.get("context_budget"))
         
         # Construct the request to OpenAI
         full_prompt = f"""
@@ -39,50 +102,25 @@ Task: {prompt}
 Tone: {tone}
 Length: {length}
 
-Recent Context:
+Relevant Context:
 {context_text}
-
+{upstream_section(task)}
 Please complete the writing task described above, taking into account any relevant context.
 """
-
-        if not OPENAI_API_KEY:
-            return "ERROR: OpenAI API key not set. Please set the OPENAI_API_KEY environment variable."
-            
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            }
-            
-            data = {
-                "model": "gpt-4",
-                "messages": [{"role": "user", "content": full_prompt}],
-                "temperature": 0.7
-            }
-            
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                # Add the result to the context for future reference
-                self.context_db.add_context({
-                    "content": f"Writing task result: {content[:100]}...",
-                    "type": "writing_result",
-                    "task_id": task["id"]
-                })
-                
-                return content
-            else:
-                return f"API Error: {response.status_code} - {response.text}"
-                
-        except Exception as e:
-            return f"Error processing writing task: {str(e)}"
+        
+        # Provider errors (LLMError) propagate so the coordinator marks the task failed
+        return await complete_streaming(
+            self.context_db, task, full_prompt, provider="openai", temperature=0.7,
+            task_type="writing", use_cache=not params.get("bypass_cache", False)
+        )
+    
+    def result_context(self, task, result):
+        # Added to the context for future reference
+        return {
+            "content": f"Writing task result: {result[:100]}...",
+            "type": "writing_result",
+            "task_id": task["id"]
+        }
 
 
 class CodingAgent(Agent):
@@ -95,13 +133,13 @@ class CodingAgent(Agent):
         """Process a coding task using OpenAI's API."""
         description = task.get("description", "")
         params = task.get("params", {})
+        get_client().require_key("openai")
         
         language = params.get("language", "python")
         file_path = params.get("file_path", "")
         
-        # Fetch context to provide to the model
-        context_entries = self.context_db.get_latest_context(5)
-        context_text = "\n".join([entry.get("content", "") for entry in context_entries])
+        # The context most relevant to this task, within the prompt token budget
+        context_text = self.context_db.assembler.assemble(description, self.specialty, params.get("context_budget"))
         
         # Construct the request to OpenAI
         full_prompt = f"""
@@ -109,70 +147,45 @@ Task: {description}
 Programming Language: {language}
 File Path (if applicable): {file_path}
 
-Recent Context:
+Relevant Context:
 {context_text}
-
+{upstream_section(task)}
 Please write code that solves the described task, taking into account any relevant context.
 Provide clean, efficient, well-documented code that follows best practices.
 """
         
-        if not OPENAI_API_KEY:
-            return "ERROR: OpenAI API key not set. Please set the OPENAI_API_KEY environment variable."
-            
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            }
-            
-            data = {
-                "model": "gpt-4",
-                "messages": [{"role": "user", "content": full_prompt}],
-                "temperature": 0.2
-            }
-            
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data
-            )
+        content = await complete_streaming(
+            self.context_db, task, full_prompt, provider="openai", temperature=0.2,
+            task_type="coding", use_cache=not params.get("bypass_cache", False)
+        )
+        
+        # If a file path was provided, save the code to that file
+        if file_path:
+            # Extract code from markdown code blocks if present
+            import re
+            code_blocks = re.findall(r'```(?:\w+)?\n([\s\S]+?)\n```', content)
             
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                # Add the result to the context for future reference
-                self.context_db.add_context({
-                    "content": f"Coding task result: {content[:100]}...",
-                    "type": "coding_result",
-                    "task_id": task["id"]
-                })
-                
-                # If a file path was provided, save the code to that file
-                if file_path:
-                    # Extract code from markdown code blocks if present
-                    import re
-                    code_blocks = re.findall(r'```(?:\w+)?\n([\s\S]+?)\n```', content)
-                    
-                    if code_blocks:
-                        code = code_blocks[0]  # Use the first code block
-                    else:
-                        code = content  # Use the full content if no code blocks are found
-                    
-                    try:
-                        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-                        with open(file_path, 'w') as f:
-                            f.write(code)
-                        return f"Code saved to {file_path}:\n\n{content}"
-                    except Exception as e:
-                        return f"Error saving code to file: {str(e)}\n\nCode:\n{content}"
-                
-                return content
+            if code_blocks:
+                code = code_blocks[0]  # Use the first code block
             else:
-                return f"API Error: {response.status_code} - {response.text}"
-                
-        except Exception as e:
-            return f"Error processing coding task: {str(e)}"
+                code = content  # Use the full content if no code blocks are found
+            
+            try:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                with open(file_path, 'w') as f:
+                    f.write(code)
+                return f"Code saved to {file_path}:\n\n{content}"
+            except Exception as e:
+                return f"Error saving code to file: {str(e)}\n\nCode:\n{content}"
+        
+        return content
+    
+    def result_context(self, task, result):
+        return {
+            "content": f"Coding task result: {result[:100]}...",
+            "type": "coding_result",
+            "task_id": task["id"]
+        }
 
 
 class ResearchAgent(Agent):
@@ -186,104 +199,42 @@ class ResearchAgent(Agent):
         description = task.get("description", "")
         params = task.get("params", {})
         
+        # Prefer Anthropic, falling back to OpenAI if its key is not set
+        client = get_client()
+        if not client.has_key("anthropic") and not client.has_key("openai"):
+            raise MissingAPIKeyError("Neither Anthropic nor OpenAI API keys are set. Please set at least one of them.",
+                                     "anthropic")
+        provider = "anthropic" if client.has_key("anthropic") else "openai"
+        
         topic = params.get("topic", description)
         depth = params.get("depth", "medium")
         
-        # Fetch context to provide to the model
-        context_entries = self.context_db.get_latest_context(5)
-        context_text = "\n".join([entry.get("content", "") for entry in context_entries])
+        # The context most relevant to this task, within the prompt token budget
+        context_text = self.context_db.assembler.assemble(topic, self.specialty, params.get("context_budget"))
         
         # Construct the request to Anthropic
         full_prompt = f"""
 Task: Research on {topic}
 Depth: {depth}
 
-Recent Context:
+Relevant Context:
 {context_text}
-
+{upstream_section(task)}
 Please conduct research on the topic described above, taking into account any relevant context.
 Provide a comprehensive summary with key points, insights, and relevant information.
 """
         
-        if not ANTHROPIC_API_KEY:
-            # Fallback to OpenAI if Anthropic API key is not set
-            if not OPENAI_API_KEY:
-                return "ERROR: Neither Anthropic nor OpenAI API keys are set. Please set at least one of them."
-            
-            # Use OpenAI as fallback
-            try:
-                headers = {
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {OPENAI_API_KEY}"
-                }
-                
-                data = {
-                    "model": "gpt-4",
-                    "messages": [{"role": "user", "content": full_prompt}],
-                    "temperature": 0.5
-                }
-                
-                response = requests.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    json=data
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    content = result["choices"][0]["message"]["content"]
-                    
-                    # Add the result to the context for future reference
-                    self.context_db.add_context({
-                        "content": f"Research task result: {content[:100]}...",
-                        "type": "research_result",
-                        "task_id": task["id"]
-                    })
-                    
-                    return content
-                else:
-                    return f"API Error: {response.status_code} - {response.text}"
-                    
-            except Exception as e:
-                return f"Error processing research task: {str(e)}"
-        
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "x-api-key": ANTHROPIC_API_KEY,
-                "anthropic-version": "2023-06-01"
-            }
-            
-            data = {
-                "model": "claude-2.1",
-                "max_tokens": 4000,
-                "prompt": f"\n\nHuman: {full_prompt}\n\nAssistant:",
-                "temperature": 0.5
-            }
-            
-            response = requests.post(
-                "https://api.anthropic.com/v1/complete",
-                headers=headers,
-                json=data
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result["completion"]
-                
-                # Add the result to the context for future reference
-                self.context_db.add_context({
-                    "content": f"Research task result: {content[:100]}...",
-                    "type": "research_result",
-                    "task_id": task["id"]
-                })
-                
-                return content
-            else:
-                return f"API Error: {response.status_code} - {response.text}"
-                
-        except Exception as e:
-            return f"Error processing research task: {str(e)}"
+        return await complete_streaming(
+            self.context_db, task, full_prompt, provider=provider, temperature=0.5,
+            task_type="research", use_cache=not params.get("bypass_cache", False)
+        )
+    
+    def result_context(self, task, result):
+        return {
+            "content": f"Research task result: {result[:100]}...",
+            "type": "research_result",
+            "task_id": task["id"]
+        }
 
 
 class CommandAgent(Agent):
@@ -303,34 +254,31 @@ class CommandAgent(Agent):
             return "Error: No command provided."
         
         try:
-            # Execute the command
-            process = await asyncio.create_subprocess_shell(
+            # Output is read as it arrives; only its head and tail are kept
+            # in the result, the full text goes to <db_path>.commands/
+            # The shared pool caps concurrent commands and applies rlimits
+            return await get_process_pool().run(
                 command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                timeout=params.get("timeout", COMMAND_TIMEOUT_SECONDS),
+                max_bytes=params.get("max_output_bytes", COMMAND_MAX_OUTPUT_BYTES),
+                max_lines=params.get("max_output_lines"),
+                spill_dir=self.context_db.db_path + ".commands",
+                spill_name=task["id"],
+                rlimits=params.get("rlimits")
             )
-            
-            stdout, stderr = await process.communicate()
-            
-            # Prepare result
-            result = {
-                "command": command,
-                "return_code": process.returncode,
-                "stdout": stdout.decode(),
-                "stderr": stderr.decode()
-            }
-            
-            # Add the result to the context for future reference
-            self.context_db.add_context({
-                "content": f"Command executed: {command}",
-                "type": "command_result",
-                "task_id": task["id"]
-            })
-            
-            return result
-                
+        
         except Exception as e:
             return f"Error executing command: {str(e)}"
+    
+    def result_context(self, task, result):
+        # Only commands that actually ran are recorded
+        if not isinstance(result, dict):
+            return None
+        return {
+            "content": f"Command executed: {result['command']}",
+            "type": "command_result",
+            "task_id": task["id"]
+        }
 
 
 class ContextSummarizerAgent(Agent):
@@ -340,68 +288,23 @@ class ContextSummarizerAgent(Agent):
         super().__init__(name, "context_summary", context_db)
     
     async def process_task(self, task):
-        """Create a summary of recent context entries."""
+        """Fold context added since the last summary into the hour/day/week rollups."""
         params = task.get("params", {})
+        get_client().require_key("openai")
         
-        # Number of context entries to summarize
-        limit = params.get("limit", 20)
+        async def complete(prompt):
+            return await get_client().complete(
+                prompt, provider="openai", temperature=0.3,
+                task_type="context_summary", use_cache=not params.get("bypass_cache", False)
+            )
         
-        # Fetch context to summarize
-        context_entries = self.context_db.get_latest_context(limit)
+        # The results of the tasks this one depends on inform the hour summaries
+        summarizer = RollupSummarizer(self.context_db, complete, upstream=upstream_section(task))
+        rollups = await summarizer.run(task["id"])
         
-        if not context_entries:
+        # Report the day the new context landed in, or today's rollup so far
+        days = [rollup for rollup in rollups if rollup["level"] == "day"]
+        latest = days[-1] if days else summarizer.latest_rollup("day")
+        if latest is None:
             return "No context entries found to summarize."
-        
-        context_text = "\n".join([
-            f"[{entry.get('created_at', '')}] {entry.get('type', 'general')}: {entry.get('content', '')}"
-            for entry in context_entries
-        ])
-        
-        # Construct the request to OpenAI
-        prompt = f"""
-Please provide a concise summary of the following context entries:
-
-{context_text}
-
-Create a clear overview that captures key points and essential information from these entries.
-The summary should be comprehensive yet brief, highlighting the most important aspects.
-"""
-        
-        if not OPENAI_API_KEY:
-            return "ERROR: OpenAI API key not set. Please set the OPENAI_API_KEY environment variable."
-            
-        try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {OPENAI_API_KEY}"
-            }
-            
-            data = {
-                "model": "gpt-4",
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": 0.3
-            }
-            
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                # Add the summary to the context
-                self.context_db.add_context({
-                    "content": content,
-                    "type": "daily_summary",
-                    "task_id": task["id"]
-                })
-                
-                return content
-            else:
-                return f"API Error: {response.status_code} - {response.text}"
-                
-        except Exception as e:
-            return f"Error creating context summary: {str(e)}" 
\ No newline at end of file
+        return latest["content"]
@@ -0,0 +1,316 @@
+import os
+import json
+import mmap
+import zlib
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Segment layout: zlib-compressed blocks of JSON lines, then a compressed
+# JSON footer describing the blocks, then a fixed trailer pointing at it.
+SEGMENT_MAGIC = b"HCS1"
+TRAILER = struct.Struct("<QQ4s")  # footer offset, footer length, magic
+BLOCK_RECORDS = 256
+
+
+# ----- Retention Policy -----
+class RetentionPolicy:
+    """How much context and finished-task history ContextDB keeps hot.
+    
+    Anything older than the age limits, or beyond the newest N entries,
+    is moved into compressed archive segments by ContextDB.apply_retention().
+    None disables a limit.
+    """
+    
+    def __init__(self, max_context_age_days=None, max_context_entries=None,
+                 max_finished_task_age_days=None, max_finished_tasks=None,
+                 finished_statuses=("completed", "failed"), check_every=1000):
+        self.max_context_age_days = max_context_age_days
+        self.max_context_entries = max_context_entries
+        self.max_finished_task_age_days = max_finished_task_age_days
+        self.max_finished_tasks = max_finished_tasks
+        self.finished_statuses = tuple(finished_statuses)
+        # Run retention automatically after this many writes
+        self.check_every = check_every
+    
+    @staticmethod
+    def _cutoff(days):
+        if days is None:
+            return None
+        return (datetime.now() - timedelta(days=days)).isoformat()
+    
+    def context_cutoff(self):
+        return self._cutoff(self.max_context_age_days)
+    
+    def task_cutoff(self):
+        return self._cutoff(self.max_finished_task_age_days)
+
+
+# ----- Segment Archive -----
+class SegmentArchive:
+    """Directory of immutable, compressed segment files.
+    
+    A small manifest lists every segment with its time range so queries
+    only open the segments that overlap them. Segments are read through
+    read-only memory maps and only the blocks a query needs are inflated.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.manifest_path = os.path.join(path, "manifest.json")
+        self.lock = threading.RLock()
+        self._maps = {}
+        self._footers = {}
+        self._manifest_key = None
+        self._dir_lock_depth = 0
+        self.manifest = {"segments": [], "next_segment": 0}
+        self._refresh()
+    
+    def _refresh(self):
+        """Reload the manifest if another process has rewritten it."""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key == self._manifest_key:
+            return
+        with self.lock:
+            with open(self.manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+            self._manifest_key = key
+    
+    def writer_lock(self):
+        """Hold off other processes' segment writes and compactions while the block runs."""
+        return self._dir_lock()
+    
+    @contextmanager
+    def _dir_lock(self):
+        # Serializes segment writers across processes; reentrant within one
+        os.makedirs(self.path, exist_ok=True)
+        if fcntl is None or self._dir_lock_depth:
+            self._dir_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._dir_lock_depth -= 1
+            return
+        with open(os.path.join(self.path, ".lock"), 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            self._dir_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._dir_lock_depth -= 1
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def close(self):
+        with self.lock:
+            for segment_map in self._maps.values():
+                segment_map.close()
+            self._maps = {}
+    
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        stat = os.stat(self.manifest_path)
+        self._manifest_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    def _segments(self, collection):
+        self._refresh()
+        return [segment for segment in self.manifest["segments"] if segment["collection"] == collection]
+    
+    def count(self, collection):
+        return sum(segment["count"] for segment in self._segments(collection))
+    
+    def write_segment(self, collection, records):
+        """Write records to a new segment and register it in the manifest."""
+        if not records:
+            return None
+        records = sorted(records, key=lambda x: x["created_at"])
+        
+        with self.lock, self._dir_lock():
+            self._refresh()
+            number = self.manifest.get("next_segment", len(self.manifest["segments"]))
+            self.manifest["next_segment"] = number + 1
+            name = f"{collection}-{number:06d}.seg"
+            blocks = []
+            tmp_path = os.path.join(self.path, name + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                for start in range(0, len(records), BLOCK_RECORDS):
+                    chunk = records[start:start + BLOCK_RECORDS]
+                    data = zlib.compress("\n".join(json.dumps(record) for record in chunk).encode())
+                    blocks.append([f.tell(), len(data), chunk[0]["created_at"], chunk[-1]["created_at"],
+                                   [record["id"] for record in chunk]])
+                    f.write(data)
+                
+                footer = zlib.compress(json.dumps({"collection": collection, "blocks": blocks}).encode())
+                footer_offset = f.tell()
+                f.write(footer)
+                f.write(TRAILER.pack(footer_offset, len(footer), SEGMENT_MAGIC))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(self.path, name))
+            
+            self.manifest["segments"].append({
+                "file": name,
+                "collection": collection,
+                "count": len(records),
+                "min_created": records[0]["created_at"],
+                "max_created": records[-1]["created_at"]
+            })
+            self._save_manifest()
+        return name
+    
+    def compact(self, collection, target_records=BLOCK_RECORDS * 64):
+        """Merge segments smaller than target_records into one larger segment."""
+        with self.lock, self._dir_lock():
+            small = [segment for segment in self._segments(collection) if segment["count"] < target_records]
+            if len(small) < 2:
+                return 0
+            
+            records = []
+            for segment in small:
+                for block in self._footer(segment["file"])["blocks"]:
+                    records.extend(self._read_block(segment["file"], block))
+            self.write_segment(collection, records)
+            
+            # The merged segment is in the manifest before the old ones leave it
+            names = {segment["file"] for segment in small}
+            self.manifest["segments"] = [segment for segment in self.manifest["segments"]
+                                         if segment["file"] not in names]
+            self._save_manifest()
+            for name in names:
+                segment_map = self._maps.pop(name, None)
+                if segment_map is not None:
+                    segment_map.close()
+                self._footers.pop(name, None)
+                os.remove(os.path.join(self.path, name))
+        return len(small)
+    
+    def _map(self, name):
+        segment_map = self._maps.get(name)
+        if segment_map is None:
+            with open(os.path.join(self.path, name), 'rb') as f:
+                segment_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[name] = segment_map
+        return segment_map
+    
+    def _footer(self, name):
+        footer = self._footers.get(name)
+        if footer is None:
+            segment_map = self._map(name)
+            offset, length, magic = TRAILER.unpack(segment_map[-TRAILER.size:])
+            if magic != SEGMENT_MAGIC:
+                raise ValueError(f"Not an archive segment: {name}")
+            footer = json.loads(zlib.decompress(segment_map[offset:offset + length]))
+            # id -> block number, so a lookup is one dict probe per segment
+            footer["ids"] = {record_id: number for number, block in enumerate(footer["blocks"])
+                             for record_id in block[4]}
+            self._footers[name] = footer
+        return footer
+    
+    def _read_block(self, name, block):
+        offset, length = block[0], block[1]
+        data = zlib.decompress(self._map(name)[offset:offset + length])
+        return [json.loads(line) for line in data.decode().split("\n")]
+    
+    def _read(self, query, *args):
+        """Run a read query, retrying if a compaction elsewhere removed a segment.
+        
+        Readers don't take the directory lock; a reader that loaded the
+        manifest just before another process compacted may try to open a
+        segment that is gone. The new manifest lists the merged segment
+        holding the same records, so reload it and try again.
+        """
+        for attempt in range(3):
+            try:
+                return query(*args)
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                with self.lock:
+                    self._manifest_key = None
+    
+    def find(self, collection, record_id):
+        return self._read(self._find, collection, record_id)
+    
+    def range(self, collection, since=None, until=None):
+        """Archived records with since <= created_at < until, oldest first."""
+        return self._read(self._range, collection, since, until)
+    
+    def latest(self, collection, limit):
+        """The newest `limit` archived records, newest first."""
+        return self._read(self._latest, collection, limit)
+    
+    def _find(self, collection, record_id):
+        with self.lock:
+            for segment in reversed(self._segments(collection)):
+                footer = self._footer(segment["file"])
+                number = footer["ids"].get(record_id)
+                if number is None:
+                    continue
+                for record in self._read_block(segment["file"], footer["blocks"][number]):
+                    if record["id"] == record_id:
+                        return record
+        return None
+    
+    def _range(self, collection, since, until):
+        results = []
+        with self.lock:
+            segments = sorted(self._segments(collection), key=lambda x: x["min_created"])
+            for segment in segments:
+                if since and segment["max_created"] < since:
+                    continue
+                if until and segment["min_created"] >= until:
+                    continue
+                for block in self._footer(segment["file"])["blocks"]:
+                    if (since and block[3] < since) or (until and block[2] >= until):
+                        continue
+                    results.extend(
+                        record for record in self._read_block(segment["file"], block)
+                        if (not since or record["created_at"] >= since)
+                        and (not until or record["created_at"] < until)
+                    )
+        results.sort(key=lambda x: x["created_at"])
+        return _unique(results)
+    
+    def _latest(self, collection, limit):
+        results = {}
+        with self.lock:
+            segments = sorted(self._segments(collection), key=lambda x: x["max_created"], reverse=True)
+            for segment in segments:
+                for block in reversed(self._footer(segment["file"])["blocks"]):
+                    for record in reversed(self._read_block(segment["file"], block)):
+                        results.setdefault(record["id"], record)
+                    if len(results) >= limit:
+                        break
+                if len(results) >= limit:
+                    break
+        return sorted(results.values(), key=lambda x: x["created_at"], reverse=True)[:limit]
+
+
+def _unique(records):
+    """records without repeated ids, keeping the first copy.
+    
+    A record is archived twice if a process dies between writing its
+    segment and deleting it from the store; the next retention run
+    archives it again.
+    """
+    seen = set()
+    unique = []
+    for record in records:
+        if record["id"] not in seen:
+            seen.add(record["id"])
+            unique.append(record)
+    return unique
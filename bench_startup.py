@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Compare ContextDB cold-start time and peak memory: full json.load vs. the hot/cold snapshot."""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+from storage import JSONStore
+
+
+def build_legacy_db(path, num_tasks, num_context, num_pending):
+    """Write a context.json in the original single-document format."""
+    start = datetime.now() - timedelta(days=30)
+    tasks = []
+    for i in range(num_tasks):
+        created = (start + timedelta(seconds=i)).isoformat()
+        task = {
+            "id": str(uuid.uuid4()),
+            "created_at": created,
+            "status": "pending" if i >= num_tasks - num_pending else "completed",
+            "description": f"Benchmark task {i}",
+            "type": "writing",
+            "params": {"tone": "professional", "length": "medium"}
+        }
+        if task["status"] == "completed":
+            task["result"] = "Lorem ipsum dolor sit amet. " * 20
+            task["completed_at"] = created
+        tasks.append(task)
+    
+    context = [{
+        "id": str(uuid.uuid4()),
+        "created_at": (start + timedelta(seconds=i)).isoformat(),
+        "content": f"Writing task result: {'lorem ipsum ' * 8}...",
+        "type": "writing_result"
+    } for i in range(num_context)]
+    
+    agents = [{
+        "id": str(uuid.uuid4()),
+        "registered_at": start.isoformat(),
+        "status": "idle",
+        "name": name,
+        "specialty": specialty
+    } for name, specialty in [("WriteBot", "writing"), ("CodeBot", "coding"), ("ResearchBot", "research"),
+                              ("CommandBot", "command"), ("SummaryBot", "context_summary")]]
+    
+    with open(path, 'w') as f:
+        json.dump({"tasks": tasks, "context": context, "agents": agents}, f, indent=2)
+    return tasks[0]["id"]
+
+
+def legacy_load(path):
+    # What ContextDB.load_or_create_db did before the hot/cold split
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def measure(label, load, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = load()
+        timings.append(time.perf_counter() - started)
+        del result
+    
+    tracemalloc.start()
+    result = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    
+    print(f"{label:<28} best {min(timings) * 1000:9.1f} ms   peak {peak / (1 << 20):8.1f} MiB")
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=200000)
+    parser.add_argument("--context", type=int, default=200000)
+    parser.add_argument("--pending", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    workdir = tempfile.mkdtemp(prefix="honeycomb-bench-")
+    try:
+        legacy_path = os.path.join(workdir, "legacy.json")
+        split_path = os.path.join(workdir, "context.json")
+        print(f"Building store: {args.tasks} tasks ({args.pending} pending), {args.context} context entries")
+        finished_id = build_legacy_db(legacy_path, args.tasks, args.context, args.pending)
+        
+        # Opening the legacy file once and snapshotting migrates it to the split layout
+        shutil.copy(legacy_path, split_path)
+        store = JSONStore(split_path)
+        store.snapshot()
+        store.close()
+        
+        print(f"legacy context.json: {os.path.getsize(legacy_path) / (1 << 20):.1f} MiB, "
+              f"hot snapshot: {os.path.getsize(split_path) / (1 << 20):.1f} MiB")
+        print()
+        
+        legacy = measure("json.load (legacy)", lambda: legacy_load(legacy_path), args.repeat)
+        split = measure("JSONStore hot snapshot", lambda: JSONStore(split_path), args.repeat)
+        
+        store = JSONStore(split_path)
+        started = time.perf_counter()
+        pending = store.get_tasks_by_status("pending")
+        print(f"{'first pending poll':<28} {(time.perf_counter() - started) * 1000:9.1f} ms   ({len(pending)} tasks)")
+        started = time.perf_counter()
+        store.get_task(finished_id)
+        print(f"{'first cold task lookup':<28} {(time.perf_counter() - started) * 1000:9.1f} ms   (loads cold index)")
+        store.close()
+        
+        print()
+        print(f"Startup speedup: {legacy / split:.1f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import os
+import json
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+
+# First byte of a blob file: how the rest is stored
+RAW = b"r"
+ZLIB = b"z"
+
+
+# ----- Blob Store -----
+class BlobStore:
+    """Content-addressed files for large values, named by their sha256.
+    
+    Blobs live at <root>/<first 2 hex digits>/<rest of the hash>, so equal
+    values are stored once and a blob never changes after it is written.
+    Bodies of at least compress_min_bytes are zlib-compressed when that
+    makes them smaller. A small LRU keeps recently read values in memory.
+    """
+    
+    def __init__(self, root, compress_min_bytes=512, level=6, cache_entries=64):
+        self.root = root
+        self.compress_min_bytes = compress_min_bytes
+        self.level = level
+        self.cache_entries = cache_entries
+        self.lock = threading.Lock()
+        self._cache = OrderedDict()  # digest -> value
+    
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+    
+    @staticmethod
+    def encode(value):
+        """(kind, bytes) for a str or any JSON-serializable value."""
+        if isinstance(value, str):
+            return "text", value.encode()
+        return "json", json.dumps(value, separators=(",", ":")).encode()
+    
+    def put(self, value):
+        """Store value and return its ref: {"sha256", "kind", "size"}."""
+        kind, data = self.encode(value)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            body = RAW + data
+            if self.compress_min_bytes is not None and len(data) >= self.compress_min_bytes:
+                compressed = zlib.compress(data, self.level)
+                if len(compressed) < len(data):
+                    body = ZLIB + compressed
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Unique temp name: another process may be writing the same blob
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        return {"sha256": digest, "kind": kind, "size": len(data)}
+    
+    def get(self, ref):
+        digest = ref["sha256"]
+        with self.lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return self._cache[digest]
+        
+        with open(self._path(digest), 'rb') as f:
+            body = f.read()
+        data = zlib.decompress(body[1:]) if body[:1] == ZLIB else body[1:]
+        value = data.decode() if ref.get("kind") == "text" else json.loads(data)
+        
+        with self.lock:
+            self._cache[digest] = value
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return value
+    
+    def exists(self, ref):
+        return os.path.exists(self._path(ref["sha256"]))
+
+
+def preview(value, chars=200):
+    """A short stand-in for a stored value: strings are clipped, dicts keep their scalar fields."""
+    if isinstance(value, str):
+        return value if len(value) <= chars else value[:chars] + "..."
+    if isinstance(value, dict):
+        return {key: preview(item, chars) for key, item in value.items()
+                if item is None or isinstance(item, (str, int, float, bool))}
+    if isinstance(value, (list, tuple)):
+        return preview(json.dumps(value), chars)
+    return value
@@ -0,0 +1,305 @@
+import os
+import time
+import signal
+import asyncio
+import threading
+from collections import deque
+
+try:
+    import resource
+except ImportError:
+    # No rlimits (e.g. Windows): commands run unconstrained
+    resource = None
+
+READ_CHUNK = 64 * 1024
+# How long to keep draining the pipes after killing a command
+KILL_GRACE_SECONDS = 1.0
+
+# Commands running at once in the shared pool (HONEYCOMB_MAX_PROCESSES)
+DEFAULT_MAX_PROCESSES = 4
+# Per-command limits applied by the pool; None leaves a limit alone.
+# Address space is opt-in: runtimes like the JVM reserve far more virtual
+# memory than they use and fail to start under a modest RLIMIT_AS.
+DEFAULT_RLIMITS = {
+    "cpu_seconds": 600,
+    "address_space": None,
+    "open_files": 1024
+}
+
+# rlimit names accepted by run_command -> (resource constant, ulimit flag, unit in bytes)
+RLIMITS = {
+    "cpu_seconds": ("RLIMIT_CPU", "-t", 1),
+    "address_space": ("RLIMIT_AS", "-v", 1024),
+    "open_files": ("RLIMIT_NOFILE", "-n", 1)
+}
+
+
+# ----- Output Capture -----
+class RotatingSpill:
+    """Append-only spill file rotated to path.1, path.2, ... every rotate_bytes."""
+    
+    def __init__(self, path, rotate_bytes=16 * 1024 * 1024, backups=2):
+        self.path = path
+        self.rotate_bytes = rotate_bytes
+        self.backups = backups
+        self.size = 0
+        self._file = open(path, 'wb')
+    
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, 'wb')
+        self.size = 0
+    
+    def write(self, data):
+        if self.rotate_bytes and self.size and self.size + len(data) > self.rotate_bytes:
+            self._rotate()
+        self._file.write(data)
+        self.size += len(data)
+    
+    def close(self):
+        self._file.close()
+
+
+class StreamCapture:
+    """Keeps the first head_bytes and last tail_bytes of a stream, spilling the rest to disk."""
+    
+    def __init__(self, head_bytes=8192, tail_bytes=8192, spill=None):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.spill = spill
+        self.head = bytearray()
+        self._tail = deque()
+        self._tail_size = 0
+        self.total_bytes = 0
+        self.lines = 0
+    
+    def feed(self, data):
+        self.total_bytes += len(data)
+        self.lines += data.count(b"\n")
+        if self.spill is not None:
+            self.spill.write(data)
+        
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if not data or not self.tail_bytes:
+            return
+        self._tail.append(data)
+        self._tail_size += len(data)
+        while self._tail_size - len(self._tail[0]) >= self.tail_bytes:
+            self._tail_size -= len(self._tail.popleft())
+    
+    def text(self):
+        """Head and tail decoded, with a marker where output was left out."""
+        tail = b"".join(self._tail)[-self.tail_bytes:] if self.tail_bytes else b""
+        omitted = self.total_bytes - len(self.head) - len(tail)
+        head = self.head.decode(errors="replace")
+        if omitted <= 0:
+            return head + tail.decode(errors="replace")
+        return f"{head}\n... [{omitted} bytes omitted] ...\n{tail.decode(errors='replace')}"
+
+
+# ----- Command Runner -----
+def _ulimit_prefix(rlimits):
+    """Shell lines applying {name: limit} from RLIMITS before the command runs.
+    
+    The limits are set by the shell itself rather than a preexec_fn: this
+    process runs threads (the HTTP pool, group-commit timers), and running
+    Python code between fork and exec can deadlock the child.
+    """
+    lines = []
+    for name, value in sorted(rlimits.items()):
+        if value is None:
+            continue
+        constant, flag, unit = RLIMITS[name]
+        value = int(value)
+        # An unprivileged process cannot raise its hard limit
+        _, hard = resource.getrlimit(getattr(resource, constant))
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        lines.append(f"ulimit {flag} {max(1, value // unit)}\n")
+    return "".join(lines)
+
+
+def _kill_group(process):
+    """SIGKILL the command and everything it started."""
+    if process.returncode is not None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+async def run_command(command, timeout=600, max_bytes=64 * 1024 * 1024, max_lines=None, head_bytes=8192,
+                      tail_bytes=8192, spill_dir=None, spill_name="command", rotate_bytes=16 * 1024 * 1024,
+                      rlimits=None):
+    """Run a shell command, reading its output as it is produced.
+    
+    Only a bounded head and tail of stdout and stderr are kept in memory;
+    with spill_dir set the full output also goes to
+    <spill_dir>/<spill_name>.stdout/.stderr (rotated every rotate_bytes).
+    The command is killed once it runs longer than timeout seconds or
+    writes more than max_bytes bytes or max_lines lines in total, and
+    "limit_exceeded" in the result says which limit it hit.
+    
+    The command runs in its own session, so a kill reaches every process
+    it started, not just the shell. rlimits ({"cpu_seconds": ...,
+    "address_space": ..., "open_files": ...}) are applied to the shell and
+    inherited by its children.
+    """
+    spills = {}
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+        for name in ("stdout", "stderr"):
+            spills[name] = RotatingSpill(os.path.join(spill_dir, f"{spill_name}.{name}"), rotate_bytes)
+    captures = {name: StreamCapture(head_bytes, tail_bytes, spills.get(name)) for name in ("stdout", "stderr")}
+    limit_exceeded = None
+    started = time.monotonic()
+    
+    shell_command = command
+    if rlimits and resource is not None:
+        shell_command = _ulimit_prefix(rlimits) + command
+    process = await asyncio.create_subprocess_shell(
+        shell_command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True
+    )
+    
+    stopped = asyncio.Event()
+    
+    def stop(reason):
+        nonlocal limit_exceeded
+        if limit_exceeded is None:
+            limit_exceeded = reason
+            stopped.set()
+            _kill_group(process)
+    
+    async def pump(stream, capture):
+        while limit_exceeded is None:
+            data = await stream.read(READ_CHUNK)
+            if not data:
+                return
+            capture.feed(data)
+            total_bytes = sum(c.total_bytes for c in captures.values())
+            if max_bytes is not None and total_bytes > max_bytes:
+                stop("bytes")
+            elif max_lines is not None and sum(c.lines for c in captures.values()) > max_lines:
+                stop("lines")
+    
+    work = asyncio.gather(
+        pump(process.stdout, captures["stdout"]),
+        pump(process.stderr, captures["stderr"]),
+        process.wait()
+    )
+    stop_wait = asyncio.ensure_future(stopped.wait())
+    try:
+        done, _ = await asyncio.wait({work, stop_wait}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if work not in done:
+            stop("timeout")
+            # Give the pipes a moment to drain once the group is gone
+            try:
+                await asyncio.wait_for(asyncio.shield(work), KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                work.cancel()
+                await asyncio.wait([work])
+        await process.wait()
+    finally:
+        stop_wait.cancel()
+        if process.returncode is None:
+            # Cancelled from outside
+            work.cancel()
+            _kill_group(process)
+        if work.done() and not work.cancelled():
+            work.exception()  # retrieved, so asyncio does not log it
+        for spill in spills.values():
+            spill.close()
+    
+    return {
+        "command": command,
+        "return_code": process.returncode,
+        "stdout": captures["stdout"].text(),
+        "stderr": captures["stderr"].text(),
+        "stdout_bytes": captures["stdout"].total_bytes,
+        "stderr_bytes": captures["stderr"].total_bytes,
+        "lines": sum(c.lines for c in captures.values()),
+        "duration": round(time.monotonic() - started, 3),
+        "limit_exceeded": limit_exceeded,
+        "output_files": {name: spill.path for name, spill in spills.items()}
+    }
+
+
+# ----- Process Pool -----
+class ProcessPool:
+    """Runs commands through run_command, at most max_concurrency at a time.
+    
+    Commands beyond that wait in FIFO order. Every command gets the pool's
+    rlimits unless the caller overrides them. get_stats() reports how many
+    commands are queued and running, how long they waited and ran, and how
+    many were killed for hitting a limit.
+    """
+    
+    def __init__(self, max_concurrency=4, rlimits=None):
+        self.max_concurrency = max_concurrency
+        self.rlimits = dict(DEFAULT_RLIMITS, **(rlimits or {}))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.queued = 0
+        self.running = 0
+        self.stats = {"completed": 0, "limit_exceeded": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                      "run_seconds": 0.0, "max_run_seconds": 0.0}
+    
+    async def run(self, command, rlimits=None, **kwargs):
+        """run_command(command, **kwargs) once a slot is free; the result includes "queued_for"."""
+        queued_at = time.monotonic()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        waited = time.monotonic() - queued_at
+        
+        self.running += 1
+        try:
+            result = await run_command(command, rlimits=dict(self.rlimits, **(rlimits or {})), **kwargs)
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+        
+        self.stats["completed"] += 1
+        self.stats["limit_exceeded"] += result["limit_exceeded"] is not None
+        self.stats["wait_seconds"] += waited
+        self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+        self.stats["run_seconds"] += result["duration"]
+        self.stats["max_run_seconds"] = max(self.stats["max_run_seconds"], result["duration"])
+        result["queued_for"] = round(waited, 3)
+        return result
+    
+    def get_stats(self):
+        stats = dict(self.stats, queued=self.queued, running=self.running, max_concurrency=self.max_concurrency)
+        completed = stats["completed"]
+        stats["avg_wait_seconds"] = stats["wait_seconds"] / completed if completed else 0.0
+        stats["avg_run_seconds"] = stats["run_seconds"] / completed if completed else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    """The process-wide pool shared by every CommandAgent."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPool(int(os.environ.get("HONEYCOMB_MAX_PROCESSES", DEFAULT_MAX_PROCESSES)))
+        return _pool
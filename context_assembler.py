@@ -0,0 +1,114 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# Words, numbers and single punctuation marks, roughly how BPE tokenizers split text
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Cosine similarity below which a candidate is not worth its tokens; short
+# unrelated texts score up to about 0.15 against each other with the hashed
+# embeddings, related ones 0.3 and up
+MIN_SCORE = 0.2
+
+
+def estimate_tokens(text):
+    """Approximate model token count: one per ~4 characters of a word, one per symbol."""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text down to about max_tokens, marking the cut with '...'."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    total = 0
+    for match in _TOKEN_RE.finditer(text):
+        total += (len(match.group()) + 3) // 4
+        if total > max_tokens:
+            return text[:match.start()].rstrip() + " ..."
+    return text
+
+
+# ----- Context Assembler -----
+class ContextAssembler:
+    """Builds the "Relevant Context" block of agent prompts within a token budget.
+    
+    Candidate entries come from ContextDB.get_relevant_context, best first.
+    Candidates scoring below min_score are dropped, so an unrelated query
+    gets little or no context instead of a full budget of noise. Each entry
+    is cut to max_entry_tokens, so one huge entry (a long summary, a pasted
+    file) cannot crowd out the rest, and entries are packed until the
+    budget is spent.
+    
+    Assembled blocks are cached per (query, budget) and tagged with
+    ContextDB.context_version; add_context bumps the version, so concurrent
+    tasks reuse a block until new context arrives. Context written by other
+    processes does not move the version, so cached blocks also expire after
+    max_age seconds.
+    """
+    
+    def __init__(self, context_db, token_budget=1500, max_entry_tokens=400, candidates=20, max_age=30.0,
+                 max_entries=256, min_score=MIN_SCORE):
+        self.context_db = context_db
+        self.token_budget = token_budget
+        self.min_score = min_score
+        self.max_entry_tokens = max_entry_tokens
+        self.candidates = candidates
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._cache = OrderedDict()  # (query, budget) -> (version, built_at, text, tokens)
+        self.stats = {"hits": 0, "misses": 0}
+        self.usage = {}  # agent type -> {"prompts": n, "tokens": n}
+    
+    def _build(self, query, budget):
+        parts = []
+        used = 0
+        for entry in self.context_db.get_relevant_context(query, self.candidates, self.min_score):
+            content = entry.get("content", "")
+            if not content:
+                continue
+            content = truncate_to_tokens(content, min(self.max_entry_tokens, budget - used))
+            tokens = estimate_tokens(content) + 1  # + the joining newline
+            if used + tokens > budget:
+                continue
+            parts.append(content)
+            used += tokens
+            if budget - used < 8:
+                break
+        return "\n".join(parts), used
+    
+    def assemble(self, query, agent_type=None, token_budget=None):
+        """The context block for a prompt about `query`, within token_budget tokens."""
+        budget = token_budget if token_budget is not None else self.token_budget
+        key = (query, budget)
+        version = self.context_db.context_version
+        now = time.monotonic()
+        with self.lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version and now - cached[1] < self.max_age:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                text, tokens = cached[2], cached[3]
+            else:
+                self.stats["misses"] += 1
+                text, tokens = self._build(query, budget)
+                self._cache[key] = (version, now, text, tokens)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            
+            if agent_type is not None:
+                usage = self.usage.setdefault(agent_type, {"prompts": 0, "tokens": 0})
+                usage["prompts"] += 1
+                usage["tokens"] += tokens
+        return text
+    
+    def get_stats(self):
+        """Cache hits/misses and context tokens spent per agent type."""
+        with self.lock:
+            usage = {
+                agent_type: dict(usage, average=usage["tokens"] / usage["prompts"])
+                for agent_type, usage in self.usage.items()
+            }
+            return dict(self.stats, usage=usage)
@@ -25,6 +25,7 @@ async def run_example():
     coordinator.register_agent(ResearchAgent("ResearchBot", context_db))
     coordinator.register_agent(CommandAgent("CommandBot", context_db))
     coordinator.register_agent(ContextSummarizerAgent("SummaryBot", context_db))
+    context_db.gc_agents()
     print("All agents registered successfully!\n")
     
     # Add example tasks
@@ -78,11 +79,8 @@ async def run_example():
     
     print("\nGenerating context summary...")
     summary_task_id = coordinator.task_queue.add_task(
-        "Summarize all recent context",
-        "context_summary",
-        {
-            "limit": 20
-        }
+        "Summarize context added since the last summary",
+        "context_summary"
     )
     
     # Find the summary agent
@@ -94,20 +92,32 @@ async def run_example():
     
     if summary_agent:
         task = context_db.get_task(summary_task_id)
-        coordinator.task_queue.assign_task(summary_task_id, summary_agent.agent_id)
-        summary_agent.update_status("busy")
+        with context_db.batch():
+            # A running worker may have claimed it already
+            claimed = coordinator.task_queue.assign_task(summary_task_id, summary_agent.agent_id, task["version"])
+            if claimed:
+                summary_agent.update_status("busy")
         
-        try:
-            result = await summary_agent.process_task(task)
-            coordinator.task_queue.complete_task(summary_task_id, result)
-            print("\nContext Summary:")
-            print("-" * 50)
-            print(result)
-            print("-" * 50)
-        except Exception as e:
-            print(f"Error generating summary: {str(e)}")
-        finally:
-            summary_agent.update_status("idle")
+        if not claimed:
+            print(f"The summary task was picked up by a worker ({summary_task_id[:8]}).")
+        else:
+            try:
+                async with coordinator.task_queue.lease_heartbeat(summary_task_id):
+                    result = await summary_agent.process_task(task)
+                with context_db.batch():
+                    coordinator.task_queue.complete_task(summary_task_id, result)
+                    summary_agent.update_status("idle")
+                print("\nContext Summary:")
+                print("-" * 50)
+                print(result)
+                print("-" * 50)
+            except Exception as e:
+                with context_db.batch():
+                    coordinator.task_queue.fail_task(summary_task_id, e)
+                    summary_agent.update_status("idle")
+                print(f"Error generating summary: {str(e)}")
+    
+    context_db.close()
     
     print("\nDemonstration completed!")
     print("\nYou can explore the full app by running:")
@@ -5,31 +5,152 @@ import sys
 import json
 import uuid
 import time
+import socket
 import asyncio
-from datetime import datetime
+from contextlib import contextmanager, asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 
+from storage import JSONStore, SQLiteStore
+from archive import SegmentArchive
+from scheduler import Scheduler
+from context_assembler import ContextAssembler
+from blobstore import BlobStore, preview
+from command_runner import get_process_pool
+
+try:
+    from vector_index import VectorIndex
+except ImportError:
+    # numpy is optional; without it relevance search falls back to recency
+    VectorIndex = None
+
+# Agent ids are derived from name + specialty so relaunching the same
+# agent reuses its record instead of adding a new one
+AGENT_NAMESPACE = uuid.UUID("6b1f3f0e-2d7a-4c55-9a43-1d8f0c6e5a21")
+# Agents not seen for this long are treated as dead by gc_agents()
+AGENT_TTL_SECONDS = 24 * 60 * 60
+# How often a long-running worker refreshes its agents' last_seen
+AGENT_HEARTBEAT_SECONDS = 60 * 60
+# Each vector index sync re-reads context created this long before the
+# newest entry it has seen, for entries other processes committed late
+VECTOR_SYNC_MARGIN = timedelta(seconds=60)
+
 # ----- Context Database -----
 class ContextDB:
-    def __init__(self, db_path="context.json"):
+    def __init__(self, db_path="context.json", backend=None, journal=True, snapshot_every=1000, fsync=False,
+                 group_commit_ms=None, retention=None, archive_path=None, hot_context=1000, vector_index=True,
+                 context_budget=1500, blob_threshold=1024):
         self.db_path = db_path
-        self.load_or_create_db()
+        
+        # Old context and finished tasks are moved out of the backend into
+        # compressed segments according to the RetentionPolicy
+        self.retention = retention
+        self.archive = SegmentArchive(archive_path or db_path + ".archive")
+        self._writes_since_retention = 0
+        
+        # backend may be a StorageBackend instance, "json" or "sqlite";
+        # by default it is picked from the file extension
+        if backend is None:
+            backend = "sqlite" if db_path.endswith((".sqlite", ".sqlite3", ".db")) else "json"
+        if backend == "json":
+            backend = JSONStore(db_path, journal=journal, snapshot_every=snapshot_every, fsync=fsync,
+                                group_commit_ms=group_commit_ms, hot_context=hot_context)
+        elif backend == "sqlite":
+            backend = SQLiteStore(db_path, group_commit_ms=group_commit_ms)
+        self.backend = backend
+        self._listeners = []
+        
+        # Embeddings of every context entry, kept in <db_path>.vectors so
+        # agents can ask for the entries most relevant to their task
+        self.vectors = None
+        # created_at of the newest entry _sync_vectors has indexed
+        self._vectors_synced = None
+        if vector_index and VectorIndex is not None:
+            self.vectors = VectorIndex(db_path + ".vectors")
+        
+        # Bumped whenever this process adds context; the assembler caches
+        # prompt context blocks against it
+        self.context_version = 0
+        self.assembler = ContextAssembler(self, token_budget=context_budget)
+        
+        # Task results larger than blob_threshold bytes are kept in
+        # <db_path>.blobs; the task record holds a ref and a preview
+        self.blobs = BlobStore(db_path + ".blobs")
+        self.blob_threshold = blob_threshold
     
-    def load_or_create_db(self):
-        if os.path.exists(self.db_path):
-            with open(self.db_path, 'r') as f:
-                self.db = json.load(f)
-        else:
-            self.db = {
-                "tasks": [],
-                "context": [],
-                "agents": []
-            }
-            self.save_db()
+    def close(self):
+        self.backend.close()
+        self.archive.close()
+    
+    def apply_retention(self, policy=None):
+        """Archive context and finished tasks that fall outside the retention policy."""
+        policy = policy or self.retention
+        self._writes_since_retention = 0
+        if policy is None:
+            return {"context": 0, "tasks": 0}
+        
+        # Selecting, archiving and deleting happen under the store's write
+        # lock and the archive's writer lock, so the records selected are
+        # still in the store and no other process running retention can
+        # archive them as well. The store lock comes first, as for any
+        # other write, so two processes cannot deadlock on the pair.
+        with self.batch():
+            self.backend.lock_for_write()
+            with self.archive.writer_lock():
+                context = self.backend.expired_context(policy.context_cutoff(), policy.max_context_entries)
+                tasks = self.backend.expired_tasks(policy.finished_statuses, policy.task_cutoff(),
+                                                   policy.max_finished_tasks)
+                
+                # Segments are written before the records are dropped: a
+                # crash in between leaves a record in both places (reads
+                # skip the second copy) but never loses it
+                self.archive.write_segment("context", context)
+                self.archive.write_segment("tasks", tasks)
+                self.backend.delete_records("context", [entry["id"] for entry in context])
+                self.backend.delete_records("tasks", [task["id"] for task in tasks])
+        
+        # Fold the small segments left by frequent runs into larger ones
+        self.archive.compact("context")
+        self.archive.compact("tasks")
+        
+        return {"context": len(context), "tasks": len(tasks)}
+    
+    def _note_write(self):
+        self._writes_since_retention += 1
+        if self.retention and self._writes_since_retention >= self.retention.check_every:
+            self.apply_retention()
+    
+    @contextmanager
+    def batch(self):
+        """Group the mutations made inside the block into a single flush.
+        
+        This only defers persistence; it is not a rollback boundary.
+        """
+        self.backend.begin_batch()
+        try:
+            yield self
+        finally:
+            self.backend.end_batch()
+    
+    transaction = batch
     
-    def save_db(self):
-        with open(self.db_path, 'w') as f:
-            json.dump(self.db, f, indent=2)
+    def flush(self):
+        self.backend.flush()
+    
+    def add_listener(self, callback):
+        """Call callback() whenever a task becomes pending in this process."""
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+    
+    def _notify(self):
+        for callback in list(self._listeners):
+            callback()
+    
+    def poll_changes(self):
+        """True if another process has written to the store since the last call."""
+        return self.backend.poll_changes()
     
     def add_task(self, task_data):
         task_id = str(uuid.uuid4())
@@ -37,28 +158,48 @@ class ContextDB:
             "id": task_id,
             "created_at": datetime.now().isoformat(),
             "status": "pending",
+            "version": 1,
             **task_data
         }
-        self.db["tasks"].append(task)
-        self.save_db()
+        self.backend.insert_task(task)
+        self._note_write()
+        if task["status"] == "pending":
+            self._notify()
         return task_id
     
-    def update_task(self, task_id, updates):
-        for task in self.db["tasks"]:
-            if task["id"] == task_id:
-                task.update(updates)
-                self.save_db()
-                return True
-        return False
+    def update_task(self, task_id, updates, expected_version=None):
+        """Update a task; with expected_version, only if nobody changed it in between."""
+        updated = self.backend.update_task(task_id, updates, expected_version)
+        if updated and updates.get("status") == "pending":
+            self._notify()
+        return updated
     
     def get_task(self, task_id):
-        for task in self.db["tasks"]:
-            if task["id"] == task_id:
-                return task
-        return None
+        task = self.backend.get_task(task_id)
+        if task is None:
+            task = self.archive.find("tasks", task_id)
+        return task
+    
+    def result_fields(self, result):
+        """Task fields for storing `result`: inline when small, else a blob ref and a preview."""
+        if self.blob_threshold is None or len(BlobStore.encode(result)[1]) <= self.blob_threshold:
+            return {"result": result}
+        return {"result_ref": self.blobs.put(result), "result_preview": preview(result)}
+    
+    def get_task_result(self, task):
+        """The full result of a task, reading it from the blob store if needed."""
+        if task.get("result_ref"):
+            return self.blobs.get(task["result_ref"])
+        return task.get("result")
     
     def get_tasks_by_status(self, status):
-        return [task for task in self.db["tasks"] if task["status"] == status]
+        return self.backend.get_tasks_by_status(status)
+    
+    def get_tasks_by_agent(self, agent_id):
+        return self.backend.get_tasks_by_agent(agent_id)
+    
+    def get_all_tasks(self):
+        return self.backend.get_all_tasks()
     
     def add_context(self, context_data):
         context_id = str(uuid.uuid4())
@@ -67,35 +208,137 @@ class ContextDB:
             "created_at": datetime.now().isoformat(),
             **context_data
         }
-        self.db["context"].append(context)
-        self.save_db()
+        self.backend.insert_context(context)
+        if self.vectors is not None:
+            self.vectors.add([context_id], [context.get("content", "")])
+        self.context_version += 1
+        self._note_write()
         return context_id
     
     def get_latest_context(self, limit=10):
-        return sorted(self.db["context"], key=lambda x: x["created_at"], reverse=True)[:limit]
+        entries = self.backend.get_latest_context(limit)
+        if len(entries) < limit and self.archive.count("context"):
+            hot_ids = {entry["id"] for entry in entries}
+            entries = entries + [entry for entry in self.archive.latest("context", limit - len(entries))
+                                 if entry["id"] not in hot_ids]
+        return entries
+    
+    def get_context_since(self, since, until=None):
+        """Return context entries created at or after `since` (and before `until`), oldest first."""
+        if isinstance(since, datetime):
+            since = since.isoformat()
+        if isinstance(until, datetime):
+            until = until.isoformat()
+        entries = self.backend.get_context_since(since, until)
+        hot_ids = {entry["id"] for entry in entries}
+        return [entry for entry in self.archive.range("context", since, until) if entry["id"] not in hot_ids] + entries
+    
+    def get_relevant_context(self, query, k=5, min_score=None):
+        """The k context entries most similar to `query`, best first.
+        
+        Entries scoring below min_score (cosine similarity) are left out.
+        Falls back to the latest k entries when numpy is not installed.
+        """
+        if self.vectors is None:
+            return self.get_latest_context(k)
+        self._sync_vectors()
+        
+        matches = self.vectors.search(query, k)
+        if min_score is not None:
+            matches = [(context_id, score) for context_id, score in matches if score >= min_score]
+        return self.get_context_entries([context_id for context_id, _ in matches])
+    
+    def _sync_vectors(self):
+        """Index context that reached the store since the last sync.
+        
+        Covers entries written by processes that do not index (no numpy,
+        vector_index=False) and, on the first query, a store that predates
+        the index. VectorIndex.add skips ids it already has, so the entries
+        re-read within VECTOR_SYNC_MARGIN are not embedded again.
+        """
+        since = ""
+        if self._vectors_synced is not None:
+            since = (datetime.fromisoformat(self._vectors_synced) - VECTOR_SYNC_MARGIN).isoformat()
+        entries = self.get_context_since(since)
+        if not entries:
+            return
+        self.vectors.add([entry["id"] for entry in entries], [entry.get("content", "") for entry in entries])
+        self._vectors_synced = max(self._vectors_synced or "", entries[-1]["created_at"])
+    
+    def get_context_entries(self, context_ids):
+        """Context entries for the given ids, in that order, including archived ones."""
+        entries = {entry["id"]: entry for entry in self.backend.get_context_entries(context_ids)}
+        results = []
+        for context_id in context_ids:
+            entry = entries.get(context_id) or self.archive.find("context", context_id)
+            if entry is not None:
+                results.append(entry)
+        return results
+    
+    def get_meta(self, key, default=None):
+        return self.backend.get_meta(key, default)
+    
+    def set_meta(self, key, value):
+        self.backend.set_meta(key, value)
+    
+    @staticmethod
+    def agent_id_for(name, specialty):
+        return str(uuid.uuid5(AGENT_NAMESPACE, f"{specialty}:{name}"))
     
     def register_agent(self, agent_data):
-        agent_id = str(uuid.uuid4())
+        """Insert or refresh an agent record keyed by its name and specialty."""
+        now = datetime.now().isoformat()
+        if "name" in agent_data and "specialty" in agent_data:
+            agent_id = self.agent_id_for(agent_data["name"], agent_data["specialty"])
+        else:
+            agent_id = str(uuid.uuid4())
+        
+        updates = {"status": "idle", "last_seen": now, "pid": os.getpid(), **agent_data}
+        if self.backend.update_agent(agent_id, updates):
+            return agent_id
+        
         agent = {
             "id": agent_id,
-            "registered_at": datetime.now().isoformat(),
-            "status": "idle",
-            **agent_data
+            "registered_at": now,
+            **updates
         }
-        self.db["agents"].append(agent)
-        self.save_db()
+        self.backend.insert_agent(agent)
         return agent_id
     
     def update_agent(self, agent_id, updates):
-        for agent in self.db["agents"]:
-            if agent["id"] == agent_id:
-                agent.update(updates)
-                self.save_db()
-                return True
-        return False
+        return self.backend.update_agent(agent_id, updates)
+    
+    def heartbeat_agent(self, agent_id, updates=None):
+        return self.backend.update_agent(agent_id, {"last_seen": datetime.now().isoformat(), **(updates or {})})
+    
+    def get_agent(self, agent_id):
+        return self.backend.get_agent(agent_id)
     
     def get_all_agents(self):
-        return self.db["agents"]
+        return self.backend.get_all_agents()
+    
+    def gc_agents(self, ttl_seconds=AGENT_TTL_SECONDS):
+        """Delete agents that have not been seen within ttl_seconds.
+        
+        Also drops records left by the old random-id registration whenever a
+        stable record for the same name and specialty exists.
+        """
+        cutoff = (datetime.now() - timedelta(seconds=ttl_seconds)).isoformat()
+        agents = self.get_all_agents()
+        stable_ids = {agent["id"] for agent in agents
+                      if agent["id"] == self.agent_id_for(agent.get("name"), agent.get("specialty"))}
+        dead = [
+            agent["id"] for agent in agents
+            if _last_seen(agent) < cutoff
+            or (agent["id"] not in stable_ids
+                and self.agent_id_for(agent.get("name"), agent.get("specialty")) in stable_ids)
+        ]
+        if dead:
+            self.backend.delete_records("agents", dead)
+        return len(dead)
+
+def _last_seen(agent):
+    return agent.get("last_seen") or agent.get("registered_at", "")
 
 # ----- Base Agent Class -----
 class Agent:
@@ -115,87 +358,642 @@ class Agent:
         """Process a task and return the result. Override in subclasses."""
         raise NotImplementedError("Subclasses must implement process_task")
     
+    def result_context(self, task, result):
+        """Context entry recording a finished task, or None.
+        
+        The coordinator adds it in the same batch that stores the result,
+        so it costs no flush of its own.
+        """
+        return None
+    
     def update_status(self, status):
-        self.context_db.update_agent(self.agent_id, {"status": status})
+        self.heartbeat({"status": status})
+    
+    def heartbeat(self, updates=None):
+        # Re-register if our record was garbage-collected while we were idle
+        if not self.context_db.heartbeat_agent(self.agent_id, updates):
+            self._register()
+            if updates:
+                self.context_db.update_agent(self.agent_id, updates)
+
+# Only the newest this many characters of a task's streamed output are kept
+# in its record; partial_offset counts the characters dropped before them
+PARTIAL_RESULT_CHARS = 4000
+
+
+class LeaseLost(Exception):
+    """The task's lease passed to another worker while this one was running it."""
+
+
+def update_leased(context_db, task_id, owner, updates):
+    """Apply updates only while `owner` still holds the task's lease."""
+    while True:
+        task = context_db.get_task(task_id)
+        if task is None or task["status"] != "assigned" or task.get("lease_owner") != owner:
+            return False
+        # A version mismatch is usually our own partial_result write;
+        # re-check the lease and try again
+        if context_db.update_task(task_id, updates, task.get("version", 0)):
+            return True
+
+
+def lease_expiry(lease_seconds):
+    """When a lease taken now runs out, in UTC so every host reads it the same way."""
+    return (datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)).isoformat()
+
+
+def lease_expired(expires_at, now):
+    """Whether a lease_expires_at string is before the aware datetime `now`."""
+    expires = datetime.fromisoformat(expires_at)
+    if expires.tzinfo is None:
+        # Written in local time by an older version
+        expires = expires.astimezone()
+    return expires < now
+
+
+def save_partial_result(context_db, task, text):
+    """Store the tail of a running task's output, under its lease when the task carries one.
+    
+    Raises LeaseLost if another worker now owns the task.
+    """
+    kept = text[-PARTIAL_RESULT_CHARS:]
+    updates = {"partial_result": kept, "partial_offset": len(text) - len(kept)}
+    if not task.get("lease_owner"):
+        context_db.update_task(task["id"], updates)
+    elif not update_leased(context_db, task["id"], task["lease_owner"], updates):
+        raise LeaseLost(f"Lost the lease on task {task['id']}")
 
 # ----- Task Queue -----
 class TaskQueue:
-    def __init__(self, context_db):
+    """Task lifecycle on top of ContextDB.
+    
+    Claiming a task takes a lease for lease_seconds, renewed by
+    lease_heartbeat() while the task runs. Only the lease holder can finish
+    the task, and reclaim_expired() puts tasks whose holder died or hung
+    back in the queue, failing them after max_attempts expired leases.
+    """
+    
+    def __init__(self, context_db, scheduler=None, lease_seconds=60, max_attempts=3, sync_interval=1.0):
         self.context_db = context_db
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        # The scheduler is re-synced with the store when a task becomes
+        # pending in this process, and at least every sync_interval seconds
+        # to pick up tasks added by other processes
+        self.sync_interval = sync_interval
+        self._stale = True
+        self._synced_at = 0.0
+        context_db.add_listener(self._mark_stale)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Identifies this queue's leases across processes and hosts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
     
-    def add_task(self, description, task_type, params=None):
+    def add_task(self, description, task_type, params=None, priority=0, deadline=None, depends_on=None):
+        """Queue a task; higher priority runs first, deadline is a datetime or ISO string.
+        
+        A task with depends_on (a list of task ids) waits until all of them
+        have completed, and fails if any of them fails.
+        """
         if params is None:
             params = {}
+        if isinstance(deadline, str):
+            # Rejected here rather than stored: the scheduler has to order by it
+            try:
+                deadline = datetime.fromisoformat(deadline)
+            except ValueError:
+                raise ValueError(f"Invalid deadline {deadline!r}; expected a datetime or ISO 8601 string") from None
+        if isinstance(deadline, datetime):
+            deadline = deadline.isoformat()
+        elif deadline is not None:
+            raise ValueError(f"Invalid deadline {deadline!r}; expected a datetime or ISO 8601 string")
         
-        return self.context_db.add_task({
+        task_data = {
             "description": description,
             "type": task_type,
-            "params": params
-        })
+            "params": params,
+            "priority": priority,
+            "deadline": deadline
+        }
+        if depends_on:
+            task_data["depends_on"] = list(depends_on)
+            ready, failed_id = self._upstream_state(task_data)
+            if failed_id:
+                task_data.update(self._upstream_failure(failed_id))
+            elif not ready:
+                task_data["status"] = "waiting"
+        
+        task_id = self.context_db.add_task(task_data)
+        task = self.context_db.get_task(task_id)
+        if task["status"] == "pending":
+            self.scheduler.push(task)
+        return task_id
+    
+    def _upstream_state(self, task):
+        """(all dependencies completed, id of a failed or missing dependency)."""
+        ready = True
+        for dependency_id in task.get("depends_on") or []:
+            dependency = self.context_db.get_task(dependency_id)
+            if dependency is None or dependency["status"] == "failed":
+                return False, dependency_id
+            if dependency["status"] != "completed":
+                ready = False
+        return ready, None
+    
+    @staticmethod
+    def _upstream_failure(dependency_id):
+        return {
+            "status": "failed",
+            "error": f"Upstream task {dependency_id} failed",
+            "error_type": "UpstreamFailed"
+        }
+    
+    def release_waiting(self):
+        """Make waiting tasks pending once their dependencies completed.
+        
+        A failed dependency fails the task instead, and that failure is
+        passed on down the chain. Returns the number of tasks changed.
+        """
+        changed = 0
+        with self.context_db.batch():
+            while True:
+                failed = 0
+                for task in list(self.context_db.get_tasks_by_status("waiting")):
+                    ready, failed_id = self._upstream_state(task)
+                    if failed_id:
+                        updates = self._upstream_failure(failed_id)
+                    elif ready:
+                        updates = {"status": "pending"}
+                    else:
+                        continue
+                    if self.context_db.update_task(task["id"], updates, task.get("version", 0)):
+                        changed += 1
+                        failed += updates["status"] == "failed"
+                # A new failure may doom tasks that were checked before it
+                if not failed:
+                    return changed
+    
+    def get_upstream_results(self, task):
+        """{dependency id: its description, type and result} for a task's depends_on."""
+        upstream = {}
+        for dependency_id in task.get("depends_on") or []:
+            dependency = self.context_db.get_task(dependency_id)
+            if dependency is not None:
+                upstream[dependency_id] = {
+                    "description": dependency.get("description", ""),
+                    "type": dependency.get("type"),
+                    "result": self.context_db.get_task_result(dependency)
+                }
+        return upstream
     
     def get_pending_tasks(self):
-        return self.context_db.get_tasks_by_status("pending")
+        """Pending tasks, most urgent first."""
+        return self.scheduler.order(self.context_db.get_tasks_by_status("pending"))
+    
+    def _mark_stale(self):
+        self._stale = True
+    
+    def refresh(self, exclude=(), force=False):
+        """Sync the scheduler with the store, e.g. tasks added by other processes.
+        
+        Reading every pending task is O(pending), so it only happens when
+        forced, when a task became pending in this process, or every
+        sync_interval seconds; returns the pending tasks, or None if the
+        queue was already current. Ids in `exclude` (tasks already handed
+        out and not yet claimed) are kept out of the queue even though they
+        are still pending.
+        """
+        now = time.monotonic()
+        if not (force or self._stale or now - self._synced_at >= self.sync_interval):
+            return None
+        self._stale = False
+        self._synced_at = now
+        pending_tasks = self.context_db.get_tasks_by_status("pending")
+        self.scheduler.sync([task for task in pending_tasks if task["id"] not in exclude])
+        return pending_tasks
+    
+    def requeue(self, task):
+        """Put a dequeued, still pending task back in line."""
+        self.scheduler.push(task)
     
-    def assign_task(self, task_id, agent_id):
+    def next_task(self, exclude=()):
+        """Dequeue the most urgent task that is still pending and not in `exclude`, or None."""
+        while True:
+            task_id = self.scheduler.pop()
+            if task_id is None:
+                return None
+            if task_id in exclude:
+                continue
+            task = self.context_db.get_task(task_id)
+            if task is not None and task["status"] == "pending":
+                return task
+    
+    def assign_task(self, task_id, agent_id, expected_version=None):
+        """Claim a task for agent_id under a lease held by this queue."""
         return self.context_db.update_task(task_id, {
             "status": "assigned",
             "agent_id": agent_id,
-            "assigned_at": datetime.now().isoformat()
-        })
+            "assigned_at": datetime.now().isoformat(),
+            "lease_owner": self.worker_id,
+            "lease_expires_at": lease_expiry(self.lease_seconds)
+        }, expected_version)
+    
+    def _update_leased(self, task_id, updates):
+        """Apply updates only while this queue still holds the task's lease."""
+        return update_leased(self.context_db, task_id, self.worker_id, updates)
+    
+    def renew_lease(self, task_id):
+        return self._update_leased(task_id, {"lease_expires_at": lease_expiry(self.lease_seconds)})
+    
+    @asynccontextmanager
+    async def lease_heartbeat(self, task_id):
+        """Keep renewing the task's lease while the block runs."""
+        async def renew():
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                if not self.renew_lease(task_id):
+                    return
+        
+        heartbeat = asyncio.ensure_future(renew())
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+    
+    def _finish(self, task_id, updates):
+        updates["lease_expires_at"] = None
+        task = self.context_db.get_task(task_id)
+        # The streamed partial output is superseded by the result
+        if task and task.get("partial_result") is not None:
+            updates["partial_result"] = None
+            updates["partial_offset"] = None
+        # Reclaiming clears lease_owner but keeps the key; only tasks
+        # assigned before leases existed are finished unchecked
+        if task and "lease_owner" in task:
+            return self._update_leased(task_id, updates)
+        return self.context_db.update_task(task_id, updates)
     
     def complete_task(self, task_id, result):
-        return self.context_db.update_task(task_id, {
+        """Store the result; False if this queue no longer holds the task's lease."""
+        return self._finish(task_id, {
             "status": "completed",
-            "result": result,
+            **self.context_db.result_fields(result),
             "completed_at": datetime.now().isoformat()
         })
+    
+    def fail_task(self, task_id, error):
+        return self._finish(task_id, {
+            "status": "failed",
+            "error": str(error),
+            "error_type": type(error).__name__
+        })
+    
+    def reclaim_expired(self):
+        """Requeue assigned tasks whose lease ran out; returns how many changed."""
+        now = datetime.now(timezone.utc)
+        # Tasks assigned before leases existed only have assigned_at, in local time
+        legacy_cutoff = (datetime.now() - timedelta(seconds=self.lease_seconds)).isoformat()
+        reclaimed = 0
+        with self.context_db.batch():
+            for task in list(self.context_db.get_tasks_by_status("assigned")):
+                expires_at = task.get("lease_expires_at")
+                if expires_at is None and "lease_owner" not in task:
+                    expired = task.get("assigned_at", "") < legacy_cutoff
+                else:
+                    expired = expires_at is not None and lease_expired(expires_at, now)
+                if not expired:
+                    continue
+                
+                attempts = task.get("attempts", 0) + 1
+                if attempts >= self.max_attempts:
+                    updates = {
+                        "status": "failed",
+                        "error": f"Lease expired {attempts} times without the task finishing",
+                        "error_type": "LeaseExpired"
+                    }
+                else:
+                    updates = {"status": "pending", "agent_id": None, "lease_owner": None}
+                updates.update({"attempts": attempts, "lease_expires_at": None})
+                if self.context_db.update_task(task["id"], updates, task.get("version", 0)):
+                    reclaimed += 1
+        return reclaimed
+    
+    async def tail_task(self, task_id, interval=0.5):
+        """Yield a task's output as it is produced, until the task finishes."""
+        shown = 0  # characters of output yielded so far
+        while True:
+            task = self.context_db.get_task(task_id)
+            if task is None:
+                return
+            if task["status"] == "failed":
+                if task.get("error"):
+                    yield "\n" + task["error"]
+                return
+            finished = task["status"] == "completed"
+            if finished:
+                text, offset = self.context_db.get_task_result(task), 0
+            else:
+                # Only the tail of long output is stored while the task runs
+                text, offset = task.get("partial_result"), task.get("partial_offset") or 0
+            if text is None:
+                text = ""
+            elif not isinstance(text, str):
+                text = json.dumps(text, indent=2)
+            
+            if offset + len(text) > shown:
+                if offset > shown:
+                    yield f"\n... [{offset - shown} characters not shown] ...\n"
+                yield text[max(0, shown - offset):]
+                shown = offset + len(text)
+            if finished:
+                return
+            await asyncio.sleep(interval)
+
+# ----- Agent Pool -----
+class AgentPool:
+    """The agents of one specialty and how work is spread over them.
+    
+    strategy is "least_loaded" (fewest tasks dispatched and not yet
+    finished) or "round_robin". With a factory the pool can grow from
+    min_size up to max_size agents as the specialty's queue deepens, one
+    agent per tasks_per_agent pending tasks, and shrinks back when idle.
+    Pooled agents are named name, name-2, name-3, ... so a regrown agent
+    reuses its stable id.
+    """
+    
+    def __init__(self, specialty, factory=None, name=None, min_size=1, max_size=None, strategy="least_loaded",
+                 tasks_per_agent=4, agent_concurrency=None):
+        if strategy not in ("least_loaded", "round_robin"):
+            raise ValueError(f"Unknown dispatch strategy: {strategy}")
+        self.specialty = specialty
+        self.factory = factory
+        self.name = name or specialty
+        self.min_size = min_size
+        self.max_size = max_size if max_size is not None else min_size
+        self.strategy = strategy
+        self.tasks_per_agent = tasks_per_agent
+        # Cap on concurrent tasks per pooled agent, None for no cap
+        self.agent_concurrency = agent_concurrency
+        self.agents = []
+        self.load = {}  # agent_id -> dispatched, unfinished tasks
+        self._next = 0
+    
+    def __len__(self):
+        return len(self.agents)
+    
+    def add(self, agent):
+        self.agents.append(agent)
+        self.load.setdefault(agent.agent_id, 0)
+    
+    def select(self):
+        if not self.agents:
+            return None
+        if self.strategy == "round_robin":
+            agent = self.agents[self._next % len(self.agents)]
+            self._next += 1
+        else:
+            # min() keeps the earliest agent on ties, so light load stays packed
+            agent = min(self.agents, key=lambda a: self.load[a.agent_id])
+        self.load[agent.agent_id] += 1
+        return agent
+    
+    def release(self, agent):
+        if agent.agent_id in self.load:
+            self.load[agent.agent_id] -= 1
+    
+    def spawn(self, context_db):
+        number = len(self.agents) + 1
+        name = self.name if number == 1 else f"{self.name}-{number}"
+        agent = self.factory(name, context_db)
+        self.add(agent)
+        return agent
+    
+    def scale(self, queue_depth, context_db):
+        """Resize towards the queue depth; returns (added, removed) agents."""
+        if self.factory is None:
+            return [], []
+        wanted = -(-queue_depth // self.tasks_per_agent)  # ceil
+        wanted = max(self.min_size, min(self.max_size, wanted))
+        
+        added = []
+        while len(self.agents) < wanted:
+            added.append(self.spawn(context_db))
+        
+        # Only idle agents are retired, newest first
+        removed = []
+        while len(self.agents) > wanted and not self.load[self.agents[-1].agent_id]:
+            agent = self.agents.pop()
+            del self.load[agent.agent_id]
+            agent.update_status("offline")
+            removed.append(agent)
+        return added, removed
+
 
 # ----- Task Coordinator -----
 class TaskCoordinator:
-    def __init__(self, context_db, agents=None):
+    """Claims pending tasks and runs them on suitable agents.
+    
+    Up to max_concurrency tasks run at once. specialty_limits and
+    agent_limits ({specialty: n} / {agent_id: n}) cap how many of those may
+    go to one specialty or one agent; max_concurrency=1 runs tasks one at
+    a time as before.
+    
+    Agents are grouped into an AgentPool per specialty; add_pool() sets up
+    a pool with its own size limits and dispatch strategy.
+    """
+    
+    def __init__(self, context_db, agents=None, max_concurrency=8, specialty_limits=None, agent_limits=None,
+                 scheduler=None, lease_seconds=60):
         self.context_db = context_db
-        self.task_queue = TaskQueue(context_db)
-        self.agents = agents or []
+        self.task_queue = TaskQueue(context_db, scheduler, lease_seconds)
+        self.agents = []
+        self.pools = {}
+        self.max_concurrency = max_concurrency
+        self.specialty_limits = specialty_limits or {}
+        self.agent_limits = agent_limits or {}
+        # agent_id -> tasks currently running on it; the agent is busy while > 0
+        self._in_flight = {}
+        # task id -> agent, for tasks handed to a _run_task future that has
+        # not finished yet; these are what the concurrency limits count
+        self._dispatched = {}
+        # Set by drain(): tasks already running finish, no new ones start
+        self.draining = False
+        for agent in agents or []:
+            self.register_agent(agent)
+    
+    def add_pool(self, specialty, factory, name=None, size=1, max_size=None, strategy="least_loaded",
+                 tasks_per_agent=4, agent_concurrency=None):
+        """Create `size` agents of a specialty with factory(name, context_db).
+        
+        With max_size > size the pool autoscales with the queue depth.
+        """
+        pool = AgentPool(specialty, factory, name, size, max_size, strategy, tasks_per_agent, agent_concurrency)
+        if specialty in self.pools:
+            for agent in self.pools[specialty].agents:
+                pool.add(agent)
+        self.pools[specialty] = pool
+        while len(pool) < size:
+            self.agents.append(pool.spawn(self.context_db))
+        return pool
     
     def register_agent(self, agent):
         self.agents.append(agent)
+        if agent.specialty not in self.pools:
+            self.pools[agent.specialty] = AgentPool(agent.specialty)
+        self.pools[agent.specialty].add(agent)
     
     def find_suitable_agent(self, task):
-        # Simple matching by task type to agent specialty
-        for agent in self.agents:
-            if agent.specialty == task["type"]:
-                return agent
-        return None
+        # Task types map to specialties; the pool picks one of its agents
+        pool = self.pools.get(task["type"])
+        return pool.select() if pool else None
     
-    async def process_pending_tasks(self):
-        pending_tasks = self.task_queue.get_pending_tasks()
-        if not pending_tasks:
-            return "No pending tasks."
-        
-        results = []
+    def autoscale(self, pending_tasks):
+        """Grow or shrink the autoscaling pools to match their queue depth."""
+        depth = {}
         for task in pending_tasks:
+            depth[task["type"]] = depth.get(task["type"], 0) + 1
+        for specialty, pool in self.pools.items():
+            added, removed = pool.scale(depth.get(specialty, 0), self.context_db)
+            self.agents.extend(added)
+            for agent in removed:
+                self.agents.remove(agent)
+    
+    def _has_capacity(self, agent):
+        """Whether one more task may start on `agent` under the specialty and agent limits."""
+        specialty_limit = self.specialty_limits.get(agent.specialty)
+        if specialty_limit is not None:
+            if sum(other.specialty == agent.specialty for other in self._dispatched.values()) >= specialty_limit:
+                return False
+        agent_limit = self.agent_limits.get(agent.agent_id)
+        if agent_limit is None and agent.specialty in self.pools:
+            agent_limit = self.pools[agent.specialty].agent_concurrency
+        if agent_limit is not None:
+            if sum(other.agent_id == agent.agent_id for other in self._dispatched.values()) >= agent_limit:
+                return False
+        return True
+    
+    def _task_started(self, agent):
+        self._in_flight[agent.agent_id] = self._in_flight.get(agent.agent_id, 0) + 1
+        if self._in_flight[agent.agent_id] == 1:
+            agent.update_status("busy")
+    
+    def _task_finished(self, agent):
+        self._in_flight[agent.agent_id] -= 1
+        if not self._in_flight[agent.agent_id]:
+            agent.update_status("idle")
+    
+    async def _run_task(self, task, agent, version):
+        try:
+            return await self._run_on_agent(task, agent, version)
+        finally:
+            self._dispatched.pop(task["id"], None)
+            self.pools[agent.specialty].release(agent)
+    
+    async def _run_on_agent(self, task, agent, version):
+        # Upstream results ride along on a copy so they are not stored
+        if task.get("depends_on"):
+            task = dict(task, upstream_results=self.task_queue.get_upstream_results(task))
+        
+        # Assign task to agent. The version check makes this a claim: if
+        # another process got to the task first, leave it to them.
+        with self.context_db.batch():
+            if not self.task_queue.assign_task(task["id"], agent.agent_id, version):
+                return f"Task {task['id']} was claimed by another worker"
+            self._task_started(agent)
+        # Lets the agent check its lease before writing progress
+        task = dict(task, lease_owner=self.task_queue.worker_id)
+        
+        # Process task. The batches are kept out of the await so a
+        # SQLite write transaction is never held open across a model call.
+        try:
+            async with self.task_queue.lease_heartbeat(task["id"]):
+                result = await agent.process_task(task)
+        except Exception as e:
+            with self.context_db.batch():
+                recorded = self.task_queue.fail_task(task["id"], e)
+                self._task_finished(agent)
+            if not recorded:
+                return f"Task {task['id']} failed after its lease expired: {str(e)}"
+            return f"Task {task['id']} failed: {str(e)}"
+        
+        with self.context_db.batch():
+            recorded = self.task_queue.complete_task(task["id"], result)
+            if recorded:
+                context = agent.result_context(task, result)
+                if context is not None:
+                    self.context_db.add_context(context)
+            self._task_finished(agent)
+        if not recorded:
+            return f"Task {task['id']} finished by {agent.name} after its lease expired; result discarded"
+        return f"Task {task['id']} completed by {agent.name}"
+    
+    def drain(self):
+        self.draining = True
+    
+    def heartbeat_agents(self):
+        """Refresh every agent's last_seen, so gc_agents() keeps idle agents of a live process."""
+        with self.context_db.batch():
+            for agent in self.agents:
+                agent.heartbeat()
+    
+    def _start_ready_tasks(self, running, results, unassignable, force_refresh=False):
+        if self.draining:
+            return
+        self.task_queue.reclaim_expired()
+        self.task_queue.release_waiting()
+        pending_tasks = self.task_queue.refresh(self._dispatched, force_refresh)
+        if pending_tasks is not None:
+            self.autoscale(pending_tasks)
+        
+        # A task is only dequeued once a slot is free for it, so the order
+        # is decided when a slot opens and a later, more urgent task still
+        # goes ahead of everything that is waiting
+        deferred = []
+        while len(self._dispatched) < self.max_concurrency:
+            task = self.task_queue.next_task(self._dispatched)
+            if task is None:
+                break
             agent = self.find_suitable_agent(task)
             if not agent:
-                results.append(f"No suitable agent found for task: {task['id']}")
+                if task["id"] not in unassignable:
+                    unassignable.add(task["id"])
+                    results.append(f"No suitable agent found for task: {task['id']}")
                 continue
-            
-            # Assign task to agent
-            self.task_queue.assign_task(task["id"], agent.agent_id)
-            agent.update_status("busy")
-            
-            # Process task
-            try:
-                result = await agent.process_task(task)
-                self.task_queue.complete_task(task["id"], result)
-                results.append(f"Task {task['id']} completed by {agent.name}")
-            except Exception as e:
-                self.context_db.update_task(task["id"], {
-                    "status": "failed",
-                    "error": str(e)
-                })
-                results.append(f"Task {task['id']} failed: {str(e)}")
-            finally:
-                agent.update_status("idle")
+            if not self._has_capacity(agent):
+                # Its specialty or agent is at its limit; other tasks may still fit
+                self.pools[agent.specialty].release(agent)
+                deferred.append(task)
+                continue
+            # Version as of dequeue: a task changed since then (e.g. claimed
+            # by another process) fails the compare-and-swap in assign_task
+            self._dispatched[task["id"]] = agent
+            running.add(asyncio.ensure_future(self._run_task(task, agent, task.get("version", 0))))
+        for task in deferred:
+            self.task_queue.requeue(task)
+    
+    async def process_pending_tasks(self):
+        """Run pending tasks, and the tasks they unblock, until none are left running.
+        
+        Every time a task finishes, tasks waiting on it are released and
+        started straight away, so a dependency graph runs as wide as its
+        branches allow and takes as long as its critical path.
+        """
+        results = []
+        running = set()
+        unassignable = set()
+        self._start_ready_tasks(running, results, unassignable, force_refresh=True)
+        if not running and not results:
+            return "No pending tasks."
+        
+        # Report tasks as they finish; one task blowing up (e.g. a storage
+        # error while recording its result) does not stop the others
+        while running:
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for run in done:
+                try:
+                    results.append(run.result())
+                except Exception as e:
+                    results.append(f"Task coordinator error: {str(e)}")
+            self._start_ready_tasks(running, results, unassignable)
         
         return "\n".join(results)
 
@@ -216,7 +1014,8 @@ def print_menu():
     print("4. Process Pending Tasks")
     print("5. View Latest Context")
     print("6. Generate Daily Summary")
-    print("7. Exit")
+    print("7. Tail a Running Task")
+    print("8. Exit")
     print()
 
 def print_agents(context_db):
@@ -234,10 +1033,24 @@ def print_agents(context_db):
         print(f"Name: {agent['name']}")
         print(f"Specialty: {agent['specialty']}")
         print(f"Status: {agent['status']}")
+        print(f"Last seen: {_last_seen(agent)}")
         print("-" * 50)
+    
+    usage = context_db.assembler.get_stats()["usage"]
+    if usage:
+        print("Prompt context tokens by agent type:")
+        for agent_type, stats in sorted(usage.items()):
+            print(f"  {agent_type}: {stats['tokens']} over {stats['prompts']} prompts "
+                  f"({stats['average']:.0f} per prompt)")
+    
+    pool = get_process_pool().get_stats()
+    if pool["completed"] or pool["running"] or pool["queued"]:
+        print(f"Command pool: {pool['running']}/{pool['max_concurrency']} running, {pool['queued']} queued, "
+              f"{pool['completed']} done (avg run {pool['avg_run_seconds']:.1f}s, "
+              f"avg wait {pool['avg_wait_seconds']:.1f}s, {pool['limit_exceeded']} killed at a limit)")
 
 def print_tasks(context_db):
-    tasks = context_db.db["tasks"]
+    tasks = context_db.get_all_tasks()
     print("\n" + "=" * 50)
     print(" " * 20 + "TASKS" + " " * 20)
     print("=" * 50)
@@ -251,21 +1064,51 @@ def print_tasks(context_db):
         print(f"Description: {task['description']}")
         print(f"Type: {task['type']}")
         print(f"Status: {task['status']}")
+        if task.get("priority"):
+            print(f"Priority: {task['priority']}")
+        if task.get("deadline"):
+            print(f"Deadline: {task['deadline']}")
+        if task.get("depends_on"):
+            print(f"Depends on: {', '.join(dependency_id[:8] + '...' for dependency_id in task['depends_on'])}")
         if task.get("agent_id"):
             print(f"Assigned to: {task['agent_id'][:8]}...")
-        if task.get("result"):
+        # Large results are stored as blobs; the preview is enough here
+        result = task.get("result") or task.get("result_preview")
+        if result:
             # For dictionary results (like from CommandAgent)
-            if isinstance(task["result"], dict):
-                print(f"Result: Command executed with return code {task['result'].get('return_code', 'unknown')}")
-                if task["result"].get("stdout"):
-                    stdout = task["result"]["stdout"]
+            if isinstance(result, dict):
+                print(f"Result: Command executed with return code {result.get('return_code', 'unknown')}")
+                if result.get("stdout"):
+                    stdout = result["stdout"]
                     print(f"Output: {stdout[:50]}..." if len(stdout) > 50 else f"Output: {stdout}")
             else:
                 # For text results
-                result_str = str(task["result"])
+                result_str = str(result)
                 print(f"Result: {result_str[:50]}..." if len(result_str) > 50 else f"Result: {result_str}")
+        elif task.get("partial_result"):
+            partial = task["partial_result"]
+            print(f"Output so far: {partial[-50:]}" if len(partial) > 50 else f"Output so far: {partial}")
         print("-" * 50)
 
+def find_task(context_db, id_prefix):
+    """Look a task up by the id prefix shown in the task list, running tasks first."""
+    task = context_db.get_task(id_prefix)
+    if task:
+        return task
+    for status in ("assigned", "pending", "waiting", "completed", "failed"):
+        for task in context_db.get_tasks_by_status(status):
+            if task["id"].startswith(id_prefix):
+                return task
+    return None
+
+async def tail_task(coordinator, task_id):
+    try:
+        async for text in coordinator.task_queue.tail_task(task_id):
+            print(text, end="", flush=True)
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    print()
+
 def print_context(context_db):
     context = context_db.get_latest_context()
     print("\n" + "=" * 50)
@@ -293,26 +1136,33 @@ def parse_json_params(params_str):
         return {}
 
 # ----- Main Application -----
-async def main():
-    context_db = ContextDB()
-    coordinator = TaskCoordinator(context_db)
+def create_coordinator(context_db, **kwargs):
+    """A TaskCoordinator with the standard set of agents registered."""
+    coordinator = TaskCoordinator(context_db, **kwargs)
     
     # Import our agent implementations
     from agents import WritingAgent, CodingAgent, ResearchAgent, CommandAgent, ContextSummarizerAgent
     
-    # Register agents
-    coordinator.register_agent(WritingAgent("WriteBot", context_db))
-    coordinator.register_agent(CodingAgent("CodeBot", context_db))
-    coordinator.register_agent(ResearchAgent("ResearchBot", context_db))
+    # Register agents. The model-backed specialties get pools that add
+    # agents (up to four) as their queues grow.
+    coordinator.add_pool("writing", WritingAgent, name="WriteBot", size=1, max_size=4)
+    coordinator.add_pool("coding", CodingAgent, name="CodeBot", size=1, max_size=4)
+    coordinator.add_pool("research", ResearchAgent, name="ResearchBot", size=1, max_size=4)
     coordinator.register_agent(CommandAgent("CommandBot", context_db))
     coordinator.register_agent(ContextSummarizerAgent("SummaryBot", context_db))
+    context_db.gc_agents()
+    return coordinator
+
+async def main():
+    context_db = ContextDB()
+    coordinator = create_coordinator(context_db)
     
     while True:
         clear_screen()
         print_header()
         print_menu()
         
-        choice = input("Enter your choice (1-7): ")
+        choice = input("Enter your choice (1-8): ")
         
         if choice == '1':
             print_agents(context_db)
@@ -344,7 +1194,7 @@ async def main():
                     params["tone"] = tone
                 if length:
                     params["length"] = length
-                    
+            
             elif task_type == "coding":
                 language = input("Enter programming language [default: python]: ")
                 file_path = input("Enter file path to save code (optional): ")
@@ -353,13 +1203,13 @@ async def main():
                     params["language"] = language
                 if file_path:
                     params["file_path"] = file_path
-                    
+            
             elif task_type == "research":
                 depth = input("Enter research depth (brief, medium, detailed) [default: medium]: ")
                 
                 if depth:
                     params["depth"] = depth
-                    
+            
             elif task_type == "command":
                 command = input("Enter shell command to execute: ")
                 if command:
@@ -368,14 +1218,6 @@ async def main():
                     print("Command is required for this task type.")
                     input("\nPress Enter to continue...")
                     continue
-                    
-            elif task_type == "context_summary":
-                limit_str = input("Enter number of entries to summarize [default: 20]: ")
-                if limit_str:
-                    try:
-                        params["limit"] = int(limit_str)
-                    except ValueError:
-                        print("Invalid number, using default.")
             
             # Allow for custom JSON parameters
             use_custom = input("Do you want to enter custom JSON parameters? (y/n) [default: n]: ").lower() == 'y'
@@ -386,7 +1228,30 @@ async def main():
                 except json.JSONDecodeError:
                     print("Invalid JSON. Using previously entered params.")
             
-            task_id = coordinator.task_queue.add_task(description, task_type, params)
+            priority_str = input("Enter priority (higher runs first) [default: 0]: ")
+            deadline_str = input("Enter deadline in minutes from now (optional): ")
+            try:
+                priority = int(priority_str) if priority_str else 0
+            except ValueError:
+                print("Invalid priority, using default.")
+                priority = 0
+            deadline = None
+            if deadline_str:
+                try:
+                    deadline = datetime.now() + timedelta(minutes=float(deadline_str))
+                except ValueError:
+                    print("Invalid deadline, ignoring it.")
+            
+            depends_str = input("Enter IDs of tasks this one needs results from, comma separated (optional): ")
+            depends_on = []
+            for id_prefix in filter(None, (part.strip() for part in depends_str.split(","))):
+                dependency = find_task(context_db, id_prefix)
+                if dependency:
+                    depends_on.append(dependency["id"])
+                else:
+                    print(f"Task {id_prefix} not found, ignoring it.")
+            
+            task_id = coordinator.task_queue.add_task(description, task_type, params, priority, deadline, depends_on)
             print(f"Task added with ID: {task_id}")
             input("\nPress Enter to continue...")
         
@@ -399,14 +1264,13 @@ async def main():
         elif choice == '5':
             print_context(context_db)
             input("\nPress Enter to continue...")
-            
+        
         elif choice == '6':
             print("Generating daily summary...")
             # Create a summary task and process it immediately
             task_id = coordinator.task_queue.add_task(
-                "Generate daily summary of all context", 
-                "context_summary",
-                {"limit": 50}
+                "Summarize context added since the last summary",
+                "context_summary"
             )
             
             summary_agent = None
@@ -417,27 +1281,49 @@ async def main():
             
             if summary_agent:
                 task = context_db.get_task(task_id)
-                coordinator.task_queue.assign_task(task_id, summary_agent.agent_id)
-                summary_agent.update_status("busy")
+                with context_db.batch():
+                    # A running worker may have claimed it already
+                    claimed = coordinator.task_queue.assign_task(task_id, summary_agent.agent_id, task["version"])
+                    if claimed:
+                        summary_agent.update_status("busy")
                 
-                try:
-                    result = await summary_agent.process_task(task)
-                    coordinator.task_queue.complete_task(task_id, result)
-                    print("\nSummary generated successfully:")
-                    print("-" * 50)
-                    print(result)
-                    print("-" * 50)
-                except Exception as e:
-                    print(f"Error generating summary: {str(e)}")
-                finally:
-                    summary_agent.update_status("idle")
+                if not claimed:
+                    print(f"The summary task was picked up by a worker; follow it with option 7 ({task_id[:8]}).")
+                else:
+                    try:
+                        async with coordinator.task_queue.lease_heartbeat(task_id):
+                            result = await summary_agent.process_task(task)
+                        with context_db.batch():
+                            coordinator.task_queue.complete_task(task_id, result)
+                            summary_agent.update_status("idle")
+                        print("\nSummary generated successfully:")
+                        print("-" * 50)
+                        print(result)
+                        print("-" * 50)
+                    except Exception as e:
+                        with context_db.batch():
+                            coordinator.task_queue.fail_task(task_id, e)
+                            summary_agent.update_status("idle")
+                        print(f"Error generating summary: {str(e)}")
             else:
                 print("No summary agent found.")
             
             input("\nPress Enter to continue...")
         
         elif choice == '7':
+            id_prefix = input("Enter task ID (the first 8 characters are enough): ").strip()
+            task = find_task(context_db, id_prefix) if id_prefix else None
+            if task:
+                print(f"Tailing task {task['id']} ({task['status']}), Ctrl-C to stop...\n")
+                await tail_task(coordinator, task["id"])
+                print(f"Status: {context_db.get_task(task['id'])['status']}")
+            else:
+                print("Task not found.")
+            input("\nPress Enter to continue...")
+        
+        elif choice == '8':
             print("Exiting...")
+            context_db.close()
             break
         
         else:
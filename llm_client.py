@@ -0,0 +1,442 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import functools
+import email.utils
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from response_cache import ResponseCache
+
+# Seconds to wait for a provider response (or the next piece of a stream);
+# HONEYCOMB_LLM_TIMEOUT overrides it for get_client()
+DEFAULT_TIMEOUT = 60
+
+
+# ----- Async Transport -----
+class AsyncTransport:
+    """Awaitable HTTP calls for the agents.
+    
+    requests is blocking, so calls run on a bounded thread pool and the
+    event loop stays free while a provider is answering. Each worker thread
+    keeps its own Session, so connections to api.openai.com and
+    api.anthropic.com are reused across tasks instead of re-handshaking.
+    """
+    
+    def __init__(self, max_workers=16, timeout=120):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="honeycomb-http")
+        self._local = threading.local()
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
+    
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            # One thread only ever has one request in flight, but keep a
+            # pooled connection per provider host
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+    
+    def _request(self, method, url, kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return self._session().request(method, url, **kwargs)
+    
+    async def request(self, method, url, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._request, method, url, kwargs))
+    
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+    
+    async def open_stream(self, method, url, **kwargs):
+        """Start a streaming request; returns (response, async iterator of lines).
+        
+        A worker thread reads the body line by line and hands each line to
+        the event loop as it arrives. For non-200 responses the body is read
+        up front and the line iterator is empty.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        kwargs["stream"] = True
+        
+        def put(kind, value):
+            loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+        
+        def produce():
+            try:
+                response = self._request(method, url, kwargs)
+                if response.status_code != 200:
+                    response.content  # read the error body here, not on the loop
+                    put("response", response)
+                    return
+                put("response", response)
+                with response:
+                    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                        if stop.is_set():
+                            break
+                        put("line", line)
+            except Exception as e:
+                put("error", e)
+            finally:
+                put("end", None)
+        
+        self._executor.submit(produce)
+        kind, value = await queue.get()
+        if kind == "error":
+            raise value
+        
+        async def lines():
+            try:
+                while True:
+                    kind, line = await queue.get()
+                    if kind == "end":
+                        return
+                    if kind == "error":
+                        raise line
+                    yield line
+            finally:
+                stop.set()
+        
+        return value, lines()
+    
+    def close(self):
+        self._executor.shutdown(wait=False)
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+
+
+_transport = None
+_transport_lock = threading.RLock()
+
+
+def get_transport():
+    """The process-wide transport shared by every agent."""
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = AsyncTransport()
+        return _transport
+
+
+# ----- Errors -----
+class LLMError(Exception):
+    """A provider call failed; status_code is None when no response arrived."""
+    
+    def __init__(self, message, provider=None, status_code=None, body=None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.body = body
+
+
+class AuthenticationError(LLMError):
+    pass
+
+
+class MissingAPIKeyError(AuthenticationError):
+    """No API key is configured for the provider; nothing was sent."""
+
+
+class BadRequestError(LLMError):
+    pass
+
+
+class RateLimitError(LLMError):
+    def __init__(self, message, provider=None, status_code=None, body=None, retry_after=None):
+        super().__init__(message, provider, status_code, body)
+        self.retry_after = retry_after
+
+
+class ServerError(LLMError):
+    pass
+
+
+class LLMTimeoutError(LLMError):
+    pass
+
+
+class LLMConnectionError(LLMError):
+    pass
+
+
+# Worth another attempt; everything else is returned to the caller at once
+RETRYABLE_ERRORS = (RateLimitError, ServerError, LLMTimeoutError, LLMConnectionError)
+
+
+def _parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+# ----- LLM Client -----
+class LLMClient:
+    """The one place agents talk to model providers.
+    
+    Builds the provider payloads, sends them over the shared AsyncTransport
+    and turns failures into LLMError subclasses. Rate limits, 5xx responses,
+    timeouts and dropped connections are retried with exponential backoff
+    and full jitter; a Retry-After header from the provider takes precedence.
+    """
+    
+    PROVIDERS = {
+        "openai": "https://api.openai.com/v1/chat/completions",
+        "anthropic": "https://api.anthropic.com/v1/complete"
+    }
+    DEFAULT_MODELS = {"openai": "gpt-4", "anthropic": "claude-2.1"}
+    
+    def __init__(self, transport=None, timeout=DEFAULT_TIMEOUT, max_retries=4, backoff_base=1.0, backoff_max=30.0,
+                 openai_api_key=None, anthropic_api_key=None, cache=None):
+        self.transport = transport or get_transport()
+        # Optional ResponseCache consulted before every provider call
+        self.cache = cache
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.api_keys = {
+            "openai": openai_api_key if openai_api_key is not None else os.environ.get("OPENAI_API_KEY", ""),
+            "anthropic": anthropic_api_key if anthropic_api_key is not None else os.environ.get("ANTHROPIC_API_KEY", "")
+        }
+    
+    def has_key(self, provider):
+        return bool(self.api_keys.get(provider))
+    
+    def require_key(self, provider):
+        """Raise MissingAPIKeyError unless an API key is set for provider."""
+        if not self.has_key(provider):
+            variable = f"{provider.upper()}_API_KEY"
+            raise MissingAPIKeyError(f"No {provider} API key; set the {variable} environment variable", provider)
+    
+    def _build_request(self, provider, prompt, model, temperature, max_tokens):
+        if provider in self.PROVIDERS:
+            self.require_key(provider)
+        model = model or self.DEFAULT_MODELS[provider]
+        if provider == "openai":
+            headers = {
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.api_keys['openai']}"
+            }
+            payload = {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature
+            }
+            if max_tokens:
+                payload["max_tokens"] = max_tokens
+        elif provider == "anthropic":
+            headers = {
+                "Content-Type": "application/json",
+                "x-api-key": self.api_keys["anthropic"],
+                "anthropic-version": "2023-06-01"
+            }
+            payload = {
+                "model": model,
+                "max_tokens": max_tokens or 4000,
+                "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
+                "temperature": temperature
+            }
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+        return headers, payload
+    
+    @staticmethod
+    def _extract(provider, body):
+        if provider == "openai":
+            return body["choices"][0]["message"]["content"]
+        return body["completion"]
+    
+    def _error_for(self, provider, response):
+        status = response.status_code
+        message = f"{provider} API error {status}: {response.text[:500]}"
+        if status == 429:
+            return RateLimitError(message, provider, status, response.text,
+                                  retry_after=_parse_retry_after(response.headers.get("Retry-After")))
+        if status in (401, 403):
+            return AuthenticationError(message, provider, status, response.text)
+        if status >= 500:
+            return ServerError(message, provider, status, response.text)
+        return BadRequestError(message, provider, status, response.text)
+    
+    def _backoff(self, attempt, error):
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    async def _send(self, provider, headers, payload):
+        try:
+            response = await self.transport.post(self.PROVIDERS[provider], headers=headers, json=payload,
+                                                 timeout=self.timeout)
+        except requests.Timeout as e:
+            raise LLMTimeoutError(f"{provider} request timed out after {self.timeout}s", provider) from e
+        except requests.ConnectionError as e:
+            raise LLMConnectionError(f"{provider} connection failed: {e}", provider) from e
+        
+        if response.status_code != 200:
+            raise self._error_for(provider, response)
+        try:
+            return self._extract(provider, response.json())
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Unexpected {provider} response: {response.text[:500]}", provider,
+                           response.status_code, response.text) from e
+    
+    @staticmethod
+    def _stream_delta(provider, event):
+        if provider == "openai":
+            choices = event.get("choices") or [{}]
+            return (choices[0].get("delta") or {}).get("content")
+        if "error" in event:
+            raise ServerError(f"anthropic stream error: {event['error']}", provider)
+        return event.get("completion")
+    
+    def _cache_key(self, provider, payload, cache_inputs):
+        """Cache key for a request: the whole payload, or with cache_inputs the
+        sampling parameters plus those inputs in place of the prompt."""
+        if cache_inputs is None:
+            return self.cache.make_key(provider=provider, payload=payload)
+        settings = {name: value for name, value in payload.items() if name not in ("messages", "prompt")}
+        return self.cache.make_key(provider=provider, payload=settings, inputs=cache_inputs)
+    
+    async def _stream_once(self, provider, headers, payload):
+        url = self.PROVIDERS[provider]
+        try:
+            response, lines = await self.transport.open_stream("POST", url, headers=headers, json=payload,
+                                                               timeout=self.timeout)
+        except requests.Timeout as e:
+            raise LLMTimeoutError(f"{provider} request timed out after {self.timeout}s", provider) from e
+        except requests.ConnectionError as e:
+            raise LLMConnectionError(f"{provider} connection failed: {e}", provider) from e
+        if response.status_code != 200:
+            raise self._error_for(provider, response)
+        
+        try:
+            async for line in lines:
+                # Server-sent events: only the data lines carry payloads
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError as e:
+                    raise LLMError(f"Unexpected {provider} stream event: {data[:500]}", provider) from e
+                delta = self._stream_delta(provider, event)
+                if delta:
+                    yield delta
+        except requests.Timeout as e:
+            raise LLMTimeoutError(f"{provider} stream stalled for {self.timeout}s", provider) from e
+        except requests.RequestException as e:
+            raise LLMConnectionError(f"{provider} stream interrupted: {e}", provider) from e
+        finally:
+            await lines.aclose()
+    
+    async def stream(self, prompt, provider="openai", model=None, temperature=0.7, max_tokens=None,
+                     task_type=None, use_cache=True, cache_inputs=None):
+        """Like complete(), but yields the completion in pieces as they arrive.
+        
+        Failures before the first piece are retried like complete(); once
+        output has been yielded a failure is raised to the caller.
+        """
+        headers, payload = self._build_request(provider, prompt, model, temperature, max_tokens)
+        key = None
+        if self.cache is not None:
+            # Same key as complete(): streaming does not change the answer
+            key = self._cache_key(provider, payload, cache_inputs)
+            if use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    yield cached
+                    return
+        payload = dict(payload, stream=True)
+        
+        parts = []
+        attempt = 0
+        while True:
+            try:
+                async for delta in self._stream_once(provider, headers, payload):
+                    parts.append(delta)
+                    yield delta
+                break
+            except RETRYABLE_ERRORS as e:
+                if parts or attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+        
+        if key is not None:
+            self.cache.put(key, "".join(parts), task_type)
+    
+    async def complete(self, prompt, provider="openai", model=None, temperature=0.7, max_tokens=None,
+                       task_type=None, use_cache=True, cache_inputs=None):
+        """Send a single-turn prompt and return the completion text.
+        
+        task_type selects the cache TTL; use_cache=False skips the cache
+        for this call (the fresh response is still stored). Responses are
+        cached by the full prompt unless cache_inputs is given: then any
+        call with the same cache_inputs and sampling parameters hits, so a
+        prompt with volatile parts (retrieved context) can still be reused.
+        """
+        headers, payload = self._build_request(provider, prompt, model, temperature, max_tokens)
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(provider, payload, cache_inputs)
+            if use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return cached
+        
+        attempt = 0
+        while True:
+            try:
+                content = await self._send(provider, headers, payload)
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                attempt += 1
+        
+        if key is not None:
+            self.cache.put(key, content, task_type)
+        return content
+
+
+_client = None
+
+
+def get_client():
+    """The process-wide LLMClient shared by every agent."""
+    global _client
+    with _transport_lock:
+        if _client is None:
+            cache_path = os.environ.get("HONEYCOMB_LLM_CACHE", "llm_cache.sqlite")
+            timeout = float(os.environ.get("HONEYCOMB_LLM_TIMEOUT", DEFAULT_TIMEOUT))
+            _client = LLMClient(timeout=timeout, cache=ResponseCache(cache_path) if cache_path else None)
+        return _client
@@ -0,0 +1,135 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# How long a cached completion stays valid per task type; None never expires
+DEFAULT_TTLS = {
+    "writing": 7 * DAY,
+    "coding": 7 * DAY,
+    "research": DAY,
+    "context_summary": HOUR
+}
+
+
+# ----- Response Cache -----
+class ResponseCache:
+    """Two-tier cache of model completions.
+    
+    A small in-memory LRU sits in front of an SQLite file that survives
+    restarts. Keys hash everything that affects the completion (provider,
+    model, prompt, temperature, ...), so a hit is a response the provider
+    could have returned for the same request.
+    """
+    
+    def __init__(self, path="llm_cache.sqlite", max_entries=1024, max_disk_entries=100000, ttls=None,
+                 default_ttl=DAY):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._puts_since_prune = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, task_type TEXT, created_at REAL, expires_at REAL, value TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses(created_at)")
+            self._prune()
+    
+    @staticmethod
+    def make_key(**request):
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+    
+    def ttl_for(self, task_type):
+        return self.ttls.get(task_type, self.default_ttl)
+    
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                if cached[0] is None or cached[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return cached[1]
+                del self._memory[key]
+            
+            if self.conn is not None:
+                row = self.conn.execute("SELECT expires_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and (row[0] is None or row[0] > now):
+                    value = json.loads(row[1])
+                    self._remember(key, row[0], value)
+                    self.stats["disk_hits"] += 1
+                    return value
+            
+            self.stats["misses"] += 1
+            return None
+    
+    def put(self, key, value, task_type=None):
+        ttl = self.ttl_for(task_type)
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        with self.lock:
+            self._remember(key, expires_at, value)
+            self.stats["stores"] += 1
+            if self.conn is None:
+                return
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, task_type, created_at, expires_at, value) VALUES (?, ?, ?, ?, ?)",
+                (key, task_type, now, expires_at, json.dumps(value))
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= 100:
+                self._prune()
+    
+    def _prune(self):
+        """Drop expired rows and the oldest rows beyond max_disk_entries."""
+        self._puts_since_prune = 0
+        self.conn.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        self.conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+    
+    def clear(self):
+        with self.lock:
+            self._memory.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM responses")
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+    
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
@@ -0,0 +1,100 @@
+import heapq
+import itertools
+from datetime import datetime
+
+NO_DEADLINE = float("inf")
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+# ----- Scheduler -----
+class Scheduler:
+    """Heap-based ready queue for pending tasks.
+    
+    Tasks carry a "priority" (higher runs first, default 0) and an optional
+    "deadline". A waiting task gains aging_per_minute priority points per
+    minute, so bulk work is never starved by a stream of urgent tasks.
+    
+    Aging is folded into a key that never changes while the task waits:
+    priority + rate * (now - enqueued) orders tasks exactly like
+    priority - rate * enqueued, because rate * now is the same for all of
+    them. Heap entries therefore never need re-sorting.
+    
+    policy="edf" runs the earliest deadline first and falls back to the
+    aged priority for ties and tasks without a deadline; with "priority"
+    the deadline only breaks ties.
+    """
+    
+    def __init__(self, policy="priority", aging_per_minute=1.0):
+        if policy not in ("priority", "edf"):
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self.aging_rate = aging_per_minute / 60.0
+        self._heap = []
+        self._keys = {}  # task_id -> key of its live heap entry
+        self._counter = itertools.count()
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def key(self, task):
+        aged = self.aging_rate * _timestamp(task["created_at"]) - task.get("priority", 0)
+        try:
+            deadline = _timestamp(task.get("deadline"))
+        except (TypeError, ValueError):
+            # Written by something that skipped add_task's check; don't let
+            # one bad record stop the whole queue
+            deadline = None
+        deadline = NO_DEADLINE if deadline is None else deadline
+        if self.policy == "edf":
+            return (deadline, aged)
+        return (aged, deadline)
+    
+    def push(self, task):
+        """Queue a task, or re-queue it if its priority or deadline changed."""
+        key = self.key(task)
+        if self._keys.get(task["id"]) == key:
+            return
+        self._keys[task["id"]] = key
+        # The counter keeps equal keys FIFO and stops comparisons reaching the id
+        heapq.heappush(self._heap, (key, next(self._counter), task["id"]))
+    
+    def discard(self, task_id):
+        # Lazy deletion: the heap entry is skipped when it reaches the top
+        self._keys.pop(task_id, None)
+    
+    def pop(self):
+        """The id of the most urgent queued task, or None. O(log n) amortized."""
+        while self._heap:
+            key, _, task_id = heapq.heappop(self._heap)
+            if self._keys.get(task_id) == key:
+                del self._keys[task_id]
+                return task_id
+        return None
+    
+    def sync(self, pending_tasks):
+        """Bring the queue in line with the store's pending tasks.
+        
+        Picks up tasks added by other processes and drops ones that are no
+        longer pending; tasks already queued with the same key cost O(1).
+        """
+        pending_ids = set()
+        for task in pending_tasks:
+            pending_ids.add(task["id"])
+            self.push(task)
+        for task_id in [task_id for task_id in self._keys if task_id not in pending_ids]:
+            self.discard(task_id)
+        # Stale entries are only dropped at the top; rebuild if they dominate
+        if len(self._heap) > 2 * len(self._keys) + 64:
+            self._heap = [entry for entry in self._heap if self._keys.get(entry[2]) == entry[0]]
+            heapq.heapify(self._heap)
+    
+    def order(self, tasks):
+        """tasks sorted most urgent first, without touching the queue."""
+        return sorted(tasks, key=self.key)
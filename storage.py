@@ -0,0 +1,1148 @@
+import os
+import json
+import bisect
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locking (e.g. Windows): JSONStore is single-process only
+    fcntl = None
+
+
+# ----- Storage Backend Interface -----
+class StorageBackend:
+    """Persistence engine behind ContextDB.
+    
+    ContextDB builds the records (ids, timestamps, defaults) and hands them
+    to the backend; the backend only stores, indexes and returns them.
+    
+    Writes made inside begin_batch()/end_batch() are persisted with one
+    flush when the outermost batch ends. With group_commit_ms set, writes
+    are instead flushed at most once every group_commit_ms milliseconds,
+    which coalesces the writes of concurrent tasks.
+    """
+    
+    def __init__(self, group_commit_ms=None):
+        self.group_commit_ms = group_commit_ms
+        self.lock = threading.RLock()
+        self._batch_depth = 0
+        self._flush_timer = None
+    
+    def begin_batch(self):
+        with self.lock:
+            self._batch_depth += 1
+    
+    def end_batch(self):
+        with self.lock:
+            self._batch_depth -= 1
+            self._after_write()
+    
+    def _after_write(self):
+        """Flush now, or leave it to the enclosing batch / group-commit timer."""
+        if self._batch_depth:
+            return
+        if not self.group_commit_ms:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.group_commit_ms / 1000, self._flush_from_timer)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def _flush_from_timer(self):
+        with self.lock:
+            self._flush_timer = None
+            # A batch is open on another thread; its end_batch reschedules us
+            if not self._batch_depth:
+                self.flush()
+    
+    def _cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+    
+    def flush(self):
+        """Persist everything written so far."""
+        pass
+    
+    def lock_for_write(self):
+        """Take the store's write lock now rather than at the next write.
+        
+        Like the lock a write takes, it is held until the next flush, so
+        inside a batch every read that follows sees the latest state and
+        no other process can write until the batch ends.
+        """
+        pass
+    
+    def insert_task(self, task):
+        raise NotImplementedError
+    
+    def update_task(self, task_id, updates, expected_version=None):
+        """Apply updates and bump the task's version.
+        
+        With expected_version set this is a compare-and-swap: nothing is
+        written and False is returned unless the stored version matches.
+        """
+        raise NotImplementedError
+    
+    def get_task(self, task_id):
+        raise NotImplementedError
+    
+    def get_tasks_by_status(self, status):
+        raise NotImplementedError
+    
+    def get_tasks_by_agent(self, agent_id):
+        raise NotImplementedError
+    
+    def get_all_tasks(self):
+        raise NotImplementedError
+    
+    def insert_context(self, entry):
+        raise NotImplementedError
+    
+    def get_latest_context(self, limit):
+        raise NotImplementedError
+    
+    def get_context_since(self, since, until=None):
+        raise NotImplementedError
+    
+    def get_context_entries(self, context_ids):
+        """Context entries for the given ids, in that order; unknown ids are skipped."""
+        raise NotImplementedError
+    
+    def insert_agent(self, agent):
+        raise NotImplementedError
+    
+    def update_agent(self, agent_id, updates):
+        raise NotImplementedError
+    
+    def get_agent(self, agent_id):
+        raise NotImplementedError
+    
+    def get_all_agents(self):
+        raise NotImplementedError
+    
+    def expired_context(self, cutoff=None, keep=None):
+        """Context created before `cutoff` or older than the newest `keep` entries, oldest first."""
+        raise NotImplementedError
+    
+    def expired_tasks(self, statuses, cutoff=None, keep=None):
+        """Tasks in `statuses` that finished before `cutoff` or beyond the newest `keep`."""
+        raise NotImplementedError
+    
+    def delete_records(self, collection, record_ids):
+        raise NotImplementedError
+    
+    def get_meta(self, key, default=None):
+        """Small JSON value stored alongside the records, e.g. a watermark."""
+        raise NotImplementedError
+    
+    def set_meta(self, key, value):
+        raise NotImplementedError
+    
+    def poll_changes(self):
+        """True if another process has written since the last call; must be cheap."""
+        return False
+    
+    def close(self):
+        pass
+
+
+def _finished_at(task):
+    return task.get("completed_at") or task["created_at"]
+
+
+def _file_key(stat):
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+# Tasks in these statuses never change again and can leave the hot set
+FINISHED_STATUSES = ("completed", "failed")
+
+
+# ----- Cold Store -----
+class ColdStore:
+    """Finished tasks and old context spilled out of the JSON snapshot.
+    
+    Records are appended to a JSON-lines file (<db_path>.cold) and a
+    tab-separated index (<db_path>.idx) maps ids to their byte offsets.
+    Neither file is read at startup: the index is loaded the first time a
+    query reaches past the hot set, and records are read one at a time.
+    """
+    
+    def __init__(self, db_path, hot_ids=None):
+        self.db_path = db_path
+        self.data_path = db_path + ".cold"
+        self.index_path = db_path + ".idx"
+        # compact() writes a new data file; the index names the current one
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                first = f.readline()
+            if first.startswith("F\t") and first.endswith("\n"):
+                self.data_path = os.path.join(os.path.dirname(self.index_path), first[2:-1])
+        # Callable returning True for ids that are in the hot set, which
+        # always wins over a stale cold copy
+        self.hot_ids = hot_ids or (lambda record_id: False)
+        self.loaded = False
+        self.tasks = {}    # id -> [offset, length, status, agent_id, created_at, finished_at]
+        self.context = {}  # id -> [offset, length, created_at]
+        self._context_order = None
+        self._data_file = None
+    
+    def load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        if not os.path.exists(self.index_path):
+            return
+        
+        with open(self.index_path, 'r') as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                fields = line[:-1].split("\t")
+                if fields[0] == "T" and len(fields) == 8 and not self.hot_ids(fields[1]):
+                    self.tasks[fields[1]] = [int(fields[6]), int(fields[7]), fields[2], fields[3] or None,
+                                             fields[4], fields[5]]
+                elif fields[0] == "C" and len(fields) == 5:
+                    self.context[fields[1]] = [int(fields[3]), int(fields[4]), fields[2]]
+                elif fields[0] == "D" and len(fields) == 2:
+                    self.tasks.pop(fields[1], None)
+                    self.context.pop(fields[1], None)
+    
+    def close(self):
+        if self._data_file:
+            self._data_file.close()
+            self._data_file = None
+    
+    def _read(self, entry):
+        if self._data_file is None:
+            self._data_file = open(self.data_path, 'rb')
+        self._data_file.seek(entry[0])
+        return json.loads(self._data_file.read(entry[1]))
+    
+    def append(self, tasks, context):
+        """Append records; the data is on disk before the index points at it."""
+        with open(self.data_path, 'ab') as f:
+            index_lines = self._write_records(f, tasks, context)
+        self._append_index(index_lines)
+        self._context_order = None
+    
+    def _write_records(self, f, tasks, context):
+        index_lines = []
+        for task in tasks:
+            data = json.dumps(task).encode() + b"\n"
+            entry = [f.tell(), len(data) - 1, task["status"], task.get("agent_id"),
+                     task["created_at"], _finished_at(task)]
+            f.write(data)
+            index_lines.append("\t".join(["T", task["id"], entry[2], entry[3] or "", entry[4], entry[5],
+                                          str(entry[0]), str(entry[1])]))
+            if self.loaded:
+                self.tasks[task["id"]] = entry
+        for item in context:
+            data = json.dumps(item).encode() + b"\n"
+            entry = [f.tell(), len(data) - 1, item["created_at"]]
+            f.write(data)
+            index_lines.append("\t".join(["C", item["id"], entry[2], str(entry[0]), str(entry[1])]))
+            if self.loaded:
+                self.context[item["id"]] = entry
+        f.flush()
+        os.fsync(f.fileno())
+        return index_lines
+    
+    def delete(self, record_ids):
+        self._append_index(["D\t" + record_id for record_id in record_ids])
+        if self.loaded:
+            for record_id in record_ids:
+                self.tasks.pop(record_id, None)
+                self.context.pop(record_id, None)
+            self._context_order = None
+    
+    def _append_index(self, lines):
+        if not lines:
+            return
+        with open(self.index_path, 'a') as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def compact(self):
+        """Rewrite the cold store without deleted or superseded records once it is mostly garbage."""
+        self.load()
+        live = sum(entry[1] + 1 for entry in self.tasks.values()) + sum(entry[1] + 1 for entry in self.context.values())
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        if size < (1 << 20) or size < 2 * live:
+            return False
+        
+        tasks = [self._read(entry) for entry in sorted(self.tasks.values())]
+        context = [self._read(entry) for entry in sorted(self.context.values())]
+        
+        # Write a new data file plus an index naming it, then swap the index
+        # in atomically; the old data file is only removed afterwards
+        old_data_path = self.data_path
+        generation = int(old_data_path.rsplit(".", 1)[1]) + 1 if old_data_path[-1].isdigit() else 1
+        new_data_path = f"{self.db_path}.cold.{generation}"
+        self.close()
+        self.tasks, self.context = {}, {}
+        with open(new_data_path, 'wb') as f:
+            index_lines = self._write_records(f, tasks, context)
+        
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("F\t" + os.path.basename(new_data_path) + "\n")
+            f.write("\n".join(index_lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+        self.data_path = new_data_path
+        self._context_order = None
+        os.remove(old_data_path)
+        return True
+    
+    def get_task(self, task_id):
+        self.load()
+        entry = self.tasks.get(task_id)
+        return self._read(entry) if entry else None
+    
+    def pop_task(self, task_id):
+        """Take a task out of the cold index so it can be updated in the hot set."""
+        task = self.get_task(task_id)
+        if task is not None:
+            del self.tasks[task_id]
+        return task
+    
+    def get_tasks(self, status=None, agent_id=None):
+        self.load()
+        entries = sorted(
+            entry for entry in self.tasks.values()
+            if (status is None or entry[2] == status) and (agent_id is None or entry[3] == agent_id)
+        )
+        return [self._read(entry) for entry in entries]
+    
+    def task_entries(self, statuses):
+        """(finished_at, task_id) for cold tasks in `statuses`, oldest first."""
+        self.load()
+        return sorted((entry[5], task_id) for task_id, entry in self.tasks.items() if entry[2] in statuses)
+    
+    def context_order(self):
+        """(created_at, id) for every cold context entry, oldest first."""
+        self.load()
+        if self._context_order is None:
+            self._context_order = sorted((entry[2], context_id) for context_id, entry in self.context.items())
+        return self._context_order
+    
+    def get_context(self, context_ids):
+        return [self._read(self.context[context_id]) for context_id in context_ids]
+    
+    def get_context_entry(self, context_id):
+        self.load()
+        entry = self.context.get(context_id)
+        return self._read(entry) if entry else None
+    
+    def get_record(self, record_id):
+        self.load()
+        entry = self.tasks.get(record_id) or self.context.get(record_id)
+        return self._read(entry) if entry else None
+
+
+# ----- JSON Store -----
+class JSONStore(StorageBackend):
+    """Single JSON document held in memory, with an optional append-only journal.
+    
+    With shared=True (the default where fcntl is available) several
+    processes can use the same files: writers hold an exclusive advisory
+    lock on <db_path>.lock while they catch up and append, and every call
+    first replays whatever other processes appended to the journal since
+    we last looked.
+    """
+    
+    def __init__(self, db_path="context.json", journal=True, snapshot_every=1000, fsync=False, group_commit_ms=None,
+                 hot_context=1000, shared=True):
+        super().__init__(group_commit_ms)
+        self.db_path = db_path
+        # In journal mode mutations are appended to <db_path>.log and the
+        # snapshot in db_path is only rewritten every `snapshot_every` entries.
+        self.journal = journal
+        self.log_path = db_path + ".log"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._log_file = None
+        self._log_entries = 0
+        self._seq = 0
+        # Journal lines / dirty flag waiting for the next flush()
+        self._pending = []
+        self._dirty = False
+        # The snapshot only carries the hot set: unfinished tasks, agents
+        # and the newest `hot_context` context entries. Everything else is
+        # spilled to the cold store and read on demand.
+        self.hot_context = hot_context
+        
+        self.shared = shared and fcntl is not None
+        self._lock_file = open(db_path + ".lock", 'a') if self.shared else None
+        self._write_locked = False
+        # What we last saw on disk, used to spot other processes' writes
+        self._db_key = None
+        self._log_key = None
+        self._log_offset = 0
+        self.load_or_create_db()
+    
+    def load_or_create_db(self):
+        if not os.path.exists(self.db_path):
+            self._acquire_write_lock()
+            try:
+                if not os.path.exists(self.db_path):
+                    self.db = {
+                        "tasks": [],
+                        "context": [],
+                        "agents": [],
+                        "meta": {}
+                    }
+                    self.cold = self._new_cold_store()
+                    self._rebuild_indexes()
+                    self.save_db()
+            finally:
+                self._release_write_lock()
+        
+        with self._read_lock():
+            self._load()
+    
+    def _load(self):
+        if self._log_file:
+            self._log_file.close()
+            self._log_file = None
+        with open(self.db_path, 'r') as f:
+            self._db_key = _file_key(os.fstat(f.fileno()))
+            self.db = json.load(f)
+        self._seq = self.db.pop("seq", 0)
+        # Stores written before meta existed
+        self.db.setdefault("meta", {})
+        self.cold = self._new_cold_store()
+        self._rebuild_indexes()
+        
+        self._log_entries = 0
+        self._log_offset = 0
+        self._log_key = None
+        if self.journal:
+            self._replay_log()
+    
+    def _new_cold_store(self):
+        return ColdStore(self.db_path, hot_ids=lambda record_id: record_id in self._tasks_by_id)
+    
+    def _acquire_write_lock(self):
+        if self.shared and not self._write_locked:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._write_locked = True
+    
+    def _release_write_lock(self):
+        if self._write_locked:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._write_locked = False
+    
+    @contextmanager
+    def _read_lock(self):
+        # A shared lock keeps writers from snapshotting under our feet; not
+        # needed when we already hold the exclusive lock
+        if not self.shared or self._write_locked:
+            yield
+            return
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def _catch_up(self):
+        """Apply changes other processes have made since we last looked."""
+        if not self.shared:
+            return
+        if self._disk_keys() == (self._db_key, self._log_key, self._log_offset):
+            return
+        
+        with self.lock, self._read_lock():
+            db_key, log_key, log_size = self._disk_keys()
+            if db_key != self._db_key or log_key != self._log_key or log_size < self._log_offset:
+                # Someone wrote a snapshot and started a new journal
+                self._load()
+            elif log_size > self._log_offset:
+                self._replay_log()
+    
+    def poll_changes(self):
+        if not self.shared or self._disk_keys() == (self._db_key, self._log_key, self._log_offset):
+            return False
+        self._catch_up()
+        return True
+    
+    def _disk_keys(self):
+        try:
+            db_key = _file_key(os.stat(self.db_path))
+        except FileNotFoundError:
+            db_key = None
+        try:
+            log_stat = os.stat(self.log_path)
+            return db_key, log_stat.st_ino, log_stat.st_size
+        except FileNotFoundError:
+            return db_key, None, 0
+    
+    def _begin_write(self):
+        # Held until the next flush() so the journal order matches the
+        # order the changes were applied in memory
+        self._acquire_write_lock()
+        self._catch_up()
+    
+    def lock_for_write(self):
+        with self.lock:
+            self._begin_write()
+    
+    def save_db(self):
+        self._spill_cold()
+        
+        # Write to a temp file and rename over the old one so a crash
+        # mid-write never leaves a truncated context.json behind
+        tmp_path = self.db_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            if self.journal:
+                json.dump({**self.db, "seq": self._seq}, f, separators=(",", ":"))
+            else:
+                json.dump(self.db, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.db_path)
+        self._db_key = _file_key(os.stat(self.db_path))
+    
+    def snapshot(self):
+        """Write a compact snapshot of the database and start a new journal."""
+        with self.lock:
+            held = self._write_locked
+            self._begin_write()
+            try:
+                self.save_db()
+                if self._log_file:
+                    self._log_file.close()
+                    self._log_file = None
+                # A fresh file (new inode) tells other processes to reload
+                tmp_path = self.log_path + ".tmp"
+                open(tmp_path, 'w').close()
+                os.replace(tmp_path, self.log_path)
+                self._log_key = os.stat(self.log_path).st_ino
+                self._log_offset = 0
+                self._log_entries = 0
+            finally:
+                if not held:
+                    self._release_write_lock()
+    
+    def close(self):
+        with self.lock:
+            self._cancel_flush_timer()
+            self.flush()
+            if self.journal and self._log_entries:
+                self.snapshot()
+            if self._log_file:
+                self._log_file.close()
+                self._log_file = None
+            self.cold.close()
+            if self._lock_file:
+                self._lock_file.close()
+                self._lock_file = None
+    
+    def _spill_cold(self):
+        tasks = [self._tasks_by_id[task_id] for status in FINISHED_STATUSES
+                 for task_id in self._tasks_by_status.get(status, ())]
+        context = self.db["context"][:max(0, len(self.db["context"]) - self.hot_context)]
+        if not tasks and not context:
+            return
+        
+        self.cold.append(tasks, context)
+        self._drop_hot("tasks", [task["id"] for task in tasks])
+        self._drop_hot("context", [entry["id"] for entry in context])
+        if self.cold.loaded:
+            self.cold.compact()
+    
+    def _replay_log(self):
+        """Apply journal entries from self._log_offset to the end of the log."""
+        if not os.path.exists(self.log_path):
+            return
+        
+        with open(self.log_path, 'rb') as f:
+            self._log_key = os.fstat(f.fileno()).st_ino
+            f.seek(self._log_offset)
+            good_offset = self._log_offset
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from a crash; everything after it is garbage
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good_offset += len(line)
+                self._log_entries += 1
+                # Entries at or below the snapshot's seq are already applied
+                if entry["seq"] > self._seq:
+                    self._apply(entry)
+                    self._seq = entry["seq"]
+            size = f.seek(0, os.SEEK_END)
+        
+        self._log_offset = good_offset
+        # Only truncate when no writer can be mid-append
+        if good_offset < size and (self._write_locked or not self.shared):
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(good_offset)
+    
+    def _rebuild_indexes(self):
+        # id -> record for tasks and agents, status -> task ids and
+        # agent_id -> task ids. The id sets are dicts so they keep
+        # insertion order, which keeps pending tasks in FIFO order.
+        self._tasks_by_id = {}
+        self._tasks_by_status = {}
+        self._tasks_by_agent = {}
+        self._agents_by_id = {}
+        for task in self.db["tasks"]:
+            self._index_task(task)
+        for agent in self.db["agents"]:
+            self._agents_by_id[agent["id"]] = agent
+        
+        # Context is kept sorted by created_at with a parallel list of
+        # timestamps, so latest-N and time-range queries are a slice/bisect
+        context = self.db["context"]
+        if any(context[i]["created_at"] > context[i + 1]["created_at"] for i in range(len(context) - 1)):
+            context.sort(key=lambda x: x["created_at"])
+        self._context_times = [entry["created_at"] for entry in context]
+        self._context_by_id = {entry["id"]: entry for entry in context}
+    
+    def _index_task(self, task):
+        self._tasks_by_id[task["id"]] = task
+        self._tasks_by_status.setdefault(task["status"], {})[task["id"]] = None
+        if task.get("agent_id"):
+            self._tasks_by_agent.setdefault(task["agent_id"], {})[task["id"]] = None
+    
+    def _unindex_task(self, task):
+        self._tasks_by_status.get(task["status"], {}).pop(task["id"], None)
+        if task.get("agent_id"):
+            self._tasks_by_agent.get(task["agent_id"], {}).pop(task["id"], None)
+    
+    def _insert_record(self, collection, record):
+        if collection == "context":
+            self._insert_context(record)
+            return
+        
+        self.db[collection].append(record)
+        if collection == "tasks":
+            self._index_task(record)
+        elif collection == "agents":
+            self._agents_by_id[record["id"]] = record
+    
+    def _insert_context(self, entry):
+        created_at = entry["created_at"]
+        self._context_by_id[entry["id"]] = entry
+        if not self._context_times or created_at >= self._context_times[-1]:
+            self.db["context"].append(entry)
+            self._context_times.append(created_at)
+        else:
+            # Only happens for out-of-order timestamps, e.g. clock changes
+            index = bisect.bisect_right(self._context_times, created_at)
+            self.db["context"].insert(index, entry)
+            self._context_times.insert(index, created_at)
+    
+    def _update_record(self, collection, record_id, updates):
+        if collection == "tasks":
+            task = self._tasks_by_id.get(record_id)
+            if task is None:
+                # Updating a finished task brings it back into the hot set
+                task = self.cold.pop_task(record_id)
+                if task is None:
+                    return None
+                self.db["tasks"].append(task)
+                self._index_task(task)
+            self._unindex_task(task)
+            task.update(updates)
+            self._index_task(task)
+            return task
+        
+        if collection == "agents":
+            agent = self._agents_by_id.get(record_id)
+            if agent is not None:
+                agent.update(updates)
+            return agent
+        
+        for record in self.db[collection]:
+            if record["id"] == record_id:
+                record.update(updates)
+                return record
+        return None
+    
+    def _delete_records(self, collection, record_ids):
+        self._drop_hot(collection, record_ids)
+        if collection != "agents":
+            self.cold.delete(list(record_ids))
+    
+    def _drop_hot(self, collection, record_ids):
+        if not record_ids:
+            return
+        record_ids = set(record_ids)
+        if collection == "tasks":
+            for record_id in record_ids:
+                task = self._tasks_by_id.pop(record_id, None)
+                if task is not None:
+                    self._unindex_task(task)
+        elif collection == "agents":
+            for record_id in record_ids:
+                self._agents_by_id.pop(record_id, None)
+        
+        self.db[collection] = [record for record in self.db[collection] if record["id"] not in record_ids]
+        if collection == "context":
+            self._context_times = [entry["created_at"] for entry in self.db["context"]]
+            for record_id in record_ids:
+                self._context_by_id.pop(record_id, None)
+    
+    def _apply(self, entry):
+        if entry["op"] == "insert":
+            self._insert_record(entry["collection"], entry["record"])
+        elif entry["op"] == "update":
+            self._update_record(entry["collection"], entry["id"], entry["updates"])
+        elif entry["op"] == "delete":
+            self._delete_records(entry["collection"], entry["ids"])
+        elif entry["op"] == "set":
+            self.db["meta"][entry["key"]] = entry["value"]
+    
+    def _commit(self, op, collection, **fields):
+        """Record one mutation that has already been applied in memory."""
+        if self.journal:
+            self._seq += 1
+            entry = {"seq": self._seq, "op": op, "collection": collection, **fields}
+            # Serialize now; the record may change again before the flush
+            self._pending.append(json.dumps(entry, separators=(",", ":")) + "\n")
+        else:
+            self._dirty = True
+        self._after_write()
+    
+    def flush(self):
+        with self.lock:
+            try:
+                if self._dirty:
+                    self._dirty = False
+                    self.save_db()
+                if self._pending:
+                    self._write_pending()
+            finally:
+                self._release_write_lock()
+    
+    def _write_pending(self):
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'ab')
+        data = "".join(self._pending).encode()
+        self._log_file.write(data)
+        self._log_file.flush()
+        if self.fsync:
+            os.fsync(self._log_file.fileno())
+        
+        self._log_offset += len(data)
+        self._log_entries += len(self._pending)
+        self._pending = []
+        if self._log_entries >= self.snapshot_every:
+            self.snapshot()
+    
+    def insert_task(self, task):
+        with self.lock:
+            self._begin_write()
+            self._insert_record("tasks", task)
+            self._commit("insert", "tasks", record=task)
+    
+    def update_task(self, task_id, updates, expected_version=None):
+        with self.lock:
+            self._begin_write()
+            task = self.get_task(task_id)
+            version = task.get("version", 0) if task else None
+            if task is None or (expected_version is not None and version != expected_version):
+                self._after_write()
+                return False
+            
+            updates = {**updates, "version": version + 1}
+            self._update_record("tasks", task_id, updates)
+            self._commit("update", "tasks", id=task_id, updates=updates)
+            return True
+    
+    def get_task(self, task_id):
+        self._catch_up()
+        task = self._tasks_by_id.get(task_id)
+        if task is None:
+            task = self.cold.get_task(task_id)
+        return task
+    
+    def get_tasks_by_status(self, status):
+        self._catch_up()
+        hot = [self._tasks_by_id[task_id] for task_id in self._tasks_by_status.get(status, ())]
+        # Only finished tasks are ever spilled, so pending/assigned polls
+        # never touch the cold store
+        if status not in FINISHED_STATUSES:
+            return hot
+        return self.cold.get_tasks(status=status) + hot
+    
+    def get_tasks_by_agent(self, agent_id):
+        self._catch_up()
+        hot = [self._tasks_by_id[task_id] for task_id in self._tasks_by_agent.get(agent_id, ())]
+        return self.cold.get_tasks(agent_id=agent_id) + hot
+    
+    def get_all_tasks(self):
+        self._catch_up()
+        return self.cold.get_tasks() + self.db["tasks"]
+    
+    def insert_context(self, entry):
+        with self.lock:
+            self._begin_write()
+            self._insert_record("context", entry)
+            self._commit("insert", "context", record=entry)
+    
+    def get_latest_context(self, limit):
+        if limit <= 0:
+            return []
+        self._catch_up()
+        entries = self.db["context"][:-limit - 1:-1]
+        if len(entries) < limit:
+            order = self.cold.context_order()
+            needed = limit - len(entries)
+            entries += self.cold.get_context([context_id for _, context_id in order[:-needed - 1:-1]])
+        return entries
+    
+    def get_context_since(self, since, until=None):
+        self._catch_up()
+        start = bisect.bisect_left(self._context_times, since)
+        end = bisect.bisect_left(self._context_times, until) if until else len(self._context_times)
+        entries = self.db["context"][start:end]
+        
+        # Cold context is always older than the hot window
+        if self._context_times and since >= self._context_times[0]:
+            return entries
+        order = self.cold.context_order()
+        cold_start = bisect.bisect_left(order, (since,))
+        cold_end = bisect.bisect_left(order, (until,)) if until else len(order)
+        return self.cold.get_context([context_id for _, context_id in order[cold_start:cold_end]]) + entries
+    
+    def get_context_entries(self, context_ids):
+        self._catch_up()
+        entries = []
+        for context_id in context_ids:
+            entry = self._context_by_id.get(context_id)
+            if entry is None:
+                entry = self.cold.get_context_entry(context_id)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+    
+    def insert_agent(self, agent):
+        with self.lock:
+            self._begin_write()
+            self._insert_record("agents", agent)
+            self._commit("insert", "agents", record=agent)
+    
+    def update_agent(self, agent_id, updates):
+        with self.lock:
+            self._begin_write()
+            if self._update_record("agents", agent_id, updates) is None:
+                self._after_write()
+                return False
+            self._commit("update", "agents", id=agent_id, updates=updates)
+            return True
+    
+    def get_agent(self, agent_id):
+        self._catch_up()
+        return self._agents_by_id.get(agent_id)
+    
+    def get_all_agents(self):
+        self._catch_up()
+        return self.db["agents"]
+    
+    def expired_context(self, cutoff=None, keep=None):
+        with self.lock:
+            self._catch_up()
+            # Ordered (created_at, id) over cold then hot entries
+            order = self.cold.context_order() + [(entry["created_at"], entry["id"]) for entry in self.db["context"]]
+            end = bisect.bisect_left(order, (cutoff,)) if cutoff else 0
+            if keep is not None:
+                end = max(end, len(order) - keep)
+            return self._records(order[:end])
+    
+    def expired_tasks(self, statuses, cutoff=None, keep=None):
+        with self.lock:
+            self._catch_up()
+            finished = self.cold.task_entries(statuses) + [
+                (_finished_at(self._tasks_by_id[task_id]), task_id)
+                for status in statuses for task_id in self._tasks_by_status.get(status, ())
+            ]
+            finished.sort()
+            end = bisect.bisect_left(finished, (cutoff,)) if cutoff else 0
+            if keep is not None:
+                end = max(end, len(finished) - keep)
+            return self._records(finished[:end])
+    
+    def get_meta(self, key, default=None):
+        self._catch_up()
+        return self.db["meta"].get(key, default)
+    
+    def set_meta(self, key, value):
+        with self.lock:
+            self._begin_write()
+            self.db["meta"][key] = value
+            self._commit("set", "meta", key=key, value=value)
+    
+    def _records(self, keyed_ids):
+        hot_context = {entry["id"]: entry for entry in self.db["context"]} if keyed_ids else {}
+        records = []
+        for _, record_id in keyed_ids:
+            record = self._tasks_by_id.get(record_id) or hot_context.get(record_id)
+            records.append(record if record is not None else self.cold.get_record(record_id))
+        return records
+    
+    def delete_records(self, collection, record_ids):
+        if not record_ids:
+            return
+        with self.lock:
+            self._begin_write()
+            self._delete_records(collection, record_ids)
+            self._commit("delete", collection, ids=list(record_ids))
+
+
+# ----- SQLite Store -----
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    type TEXT,
+    status TEXT NOT NULL,
+    agent_id TEXT,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS idx_tasks_type ON tasks (type);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at);
+CREATE INDEX IF NOT EXISTS idx_tasks_agent_id ON tasks (agent_id);
+
+CREATE TABLE IF NOT EXISTS context (
+    id TEXT PRIMARY KEY,
+    type TEXT,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_context_created_at ON context (created_at);
+CREATE INDEX IF NOT EXISTS idx_context_type ON context (type);
+
+CREATE TABLE IF NOT EXISTS agents (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Columns mirrored out of the JSON body so they can be indexed
+TASK_COLUMNS = ("type", "status", "agent_id")
+# "No limit" for LIMIT -1 OFFSET ? when a keep-count is not set
+MAX_OFFSET = 2 ** 62
+
+
+class SQLiteStore(StorageBackend):
+    """SQLite engine: WAL mode, indexed columns, one connection per store.
+    
+    Each store owns its connection, so a batch or group commit only ever
+    commits (or rolls back) that store's own writes; two stores on the
+    same file in one process wait for each other like two processes do.
+    sqlite3 caches the compiled form of each statement per connection, so
+    the statements below are prepared once per store.
+    """
+    
+    def __init__(self, db_path="context.sqlite", group_commit_ms=None):
+        super().__init__(group_commit_ms)
+        self.db_path = db_path
+        self.conn = self._connect(db_path)
+        self._data_version = None
+    
+    @staticmethod
+    def _connect(db_path):
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves
+        conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(SQLITE_SCHEMA)
+        return conn
+    
+    def _begin(self):
+        # Batches and group commit keep one write transaction open until
+        # flush(); plain writes get a transaction of their own
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+    
+    def flush(self):
+        with self.lock:
+            if self.conn.in_transaction:
+                self.conn.execute("COMMIT")
+    
+    def lock_for_write(self):
+        with self.lock:
+            self._begin()
+    
+    def _write(self, sql, params=()):
+        with self.lock:
+            self._begin()
+            self.conn.execute(sql, params)
+            self._after_write()
+    
+    def _read(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+    
+    def _update_json(self, table, record_id, updates, columns=(), expected_version=None):
+        # Read-modify-write inside a BEGIN IMMEDIATE transaction so another
+        # process cannot slip an update in between
+        with self.lock:
+            self._begin()
+            try:
+                row = self.conn.execute(f"SELECT data FROM {table} WHERE id = ?", (record_id,)).fetchone()
+                record = json.loads(row[0]) if row is not None else None
+                if record is not None and expected_version is not None and record.get("version", 0) != expected_version:
+                    record = None
+                if record is not None:
+                    if table == "tasks":
+                        updates = {**updates, "version": record.get("version", 0) + 1}
+                    record.update(updates)
+                    assignments = "".join(f", {column} = ?" for column in columns)
+                    self.conn.execute(
+                        f"UPDATE {table} SET data = ?{assignments} WHERE id = ?",
+                        (json.dumps(record), *(record.get(column) for column in columns), record_id)
+                    )
+            except Exception:
+                if not self._batch_depth and not self.group_commit_ms:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._after_write()
+            return record is not None
+    
+    def poll_changes(self):
+        # data_version only moves when another connection commits
+        version = self._read("PRAGMA data_version")[0][0]
+        changed = self._data_version is not None and version != self._data_version
+        self._data_version = version
+        return changed
+    
+    def close(self):
+        with self.lock:
+            if self.conn is None:
+                return
+            self._cancel_flush_timer()
+            self.flush()
+            # Fold the WAL back into the main file
+            self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            self.conn.close()
+            self.conn = None
+    
+    def insert_task(self, task):
+        self._write(
+            "INSERT INTO tasks (id, type, status, agent_id, created_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (task["id"], task.get("type"), task["status"], task.get("agent_id"), task["created_at"], json.dumps(task))
+        )
+    
+    def update_task(self, task_id, updates, expected_version=None):
+        return self._update_json("tasks", task_id, updates, TASK_COLUMNS, expected_version)
+    
+    def get_task(self, task_id):
+        rows = self._read("SELECT data FROM tasks WHERE id = ?", (task_id,))
+        return json.loads(rows[0][0]) if rows else None
+    
+    def get_tasks_by_status(self, status):
+        rows = self._read("SELECT data FROM tasks WHERE status = ? ORDER BY rowid", (status,))
+        return [json.loads(row[0]) for row in rows]
+    
+    def get_tasks_by_agent(self, agent_id):
+        rows = self._read("SELECT data FROM tasks WHERE agent_id = ? ORDER BY rowid", (agent_id,))
+        return [json.loads(row[0]) for row in rows]
+    
+    def get_all_tasks(self):
+        rows = self._read("SELECT data FROM tasks ORDER BY rowid")
+        return [json.loads(row[0]) for row in rows]
+    
+    def insert_context(self, entry):
+        self._write(
+            "INSERT INTO context (id, type, created_at, data) VALUES (?, ?, ?, ?)",
+            (entry["id"], entry.get("type"), entry["created_at"], json.dumps(entry))
+        )
+    
+    def get_latest_context(self, limit):
+        if limit <= 0:
+            return []
+        rows = self._read("SELECT data FROM context ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [json.loads(row[0]) for row in rows]
+    
+    def get_context_since(self, since, until=None):
+        if until:
+            rows = self._read(
+                "SELECT data FROM context WHERE created_at >= ? AND created_at < ? ORDER BY created_at",
+                (since, until)
+            )
+        else:
+            rows = self._read("SELECT data FROM context WHERE created_at >= ? ORDER BY created_at", (since,))
+        return [json.loads(row[0]) for row in rows]
+    
+    def get_context_entries(self, context_ids):
+        found = {}
+        context_ids = list(context_ids)
+        for start in range(0, len(context_ids), 500):
+            chunk = context_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            for row in self._read(f"SELECT data FROM context WHERE id IN ({placeholders})", chunk):
+                entry = json.loads(row[0])
+                found[entry["id"]] = entry
+        return [found[context_id] for context_id in context_ids if context_id in found]
+    
+    def insert_agent(self, agent):
+        self._write("INSERT INTO agents (id, data) VALUES (?, ?)", (agent["id"], json.dumps(agent)))
+    
+    def update_agent(self, agent_id, updates):
+        return self._update_json("agents", agent_id, updates)
+    
+    def get_agent(self, agent_id):
+        rows = self._read("SELECT data FROM agents WHERE id = ?", (agent_id,))
+        return json.loads(rows[0][0]) if rows else None
+    
+    def get_all_agents(self):
+        rows = self._read("SELECT data FROM agents ORDER BY rowid")
+        return [json.loads(row[0]) for row in rows]
+    
+    def get_meta(self, key, default=None):
+        rows = self._read("SELECT value FROM meta WHERE key = ?", (key,))
+        return json.loads(rows[0][0]) if rows else default
+    
+    def set_meta(self, key, value):
+        self._write("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+    
+    def expired_context(self, cutoff=None, keep=None):
+        rows = self._read(
+            "SELECT data FROM context WHERE created_at < ? OR id IN "
+            "(SELECT id FROM context ORDER BY created_at DESC LIMIT -1 OFFSET ?) ORDER BY created_at",
+            (cutoff or "", keep if keep is not None else MAX_OFFSET)
+        )
+        return [json.loads(row[0]) for row in rows]
+    
+    def expired_tasks(self, statuses, cutoff=None, keep=None):
+        placeholders = ", ".join("?" for _ in statuses)
+        finished_at = "COALESCE(json_extract(data, '$.completed_at'), created_at)"
+        rows = self._read(
+            f"SELECT data FROM tasks WHERE status IN ({placeholders}) AND ({finished_at} < ? OR id IN "
+            f"(SELECT id FROM tasks WHERE status IN ({placeholders}) ORDER BY {finished_at} DESC LIMIT -1 OFFSET ?)) "
+            f"ORDER BY {finished_at}",
+            (*statuses, cutoff or "", *statuses, keep if keep is not None else MAX_OFFSET)
+        )
+        return [json.loads(row[0]) for row in rows]
+    
+    def delete_records(self, collection, record_ids):
+        record_ids = list(record_ids)
+        with self.lock:
+            self._begin()
+            for start in range(0, len(record_ids), 500):
+                chunk = record_ids[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                self.conn.execute(f"DELETE FROM {collection} WHERE id IN ({placeholders})", chunk)
+            self._after_write()
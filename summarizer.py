@@ -0,0 +1,244 @@
+import asyncio
+from datetime import datetime, timedelta
+
+ROLLUP_TYPE = "summary_rollup"
+LEVELS = ("hour", "day", "week")
+
+# ContextDB meta keys
+WATERMARK_KEY = "summary_watermark"
+ROLLUPS_KEY = "summary_rollups"
+
+# With no watermark yet, only context from this far back is summarized;
+# older history would cost a model call per hour it covers
+FIRST_RUN_BACKLOG = timedelta(days=7)
+
+# Rollup ids kept in the meta index per level; older periods are only
+# reachable as ordinary context records
+KEEP_PERIODS = {"hour": 24 * 8, "day": 7 * 8, "week": None}
+
+
+def period_start(level, created_at):
+    """Start of the hour, day or (Monday-based) week containing created_at."""
+    moment = datetime.fromisoformat(created_at)
+    start = moment.replace(minute=0, second=0, microsecond=0)
+    if level == "hour":
+        return start
+    start = start.replace(hour=0)
+    if level == "day":
+        return start
+    return start - timedelta(days=start.weekday())
+
+
+def period_end(level, start):
+    if level == "hour":
+        return start + timedelta(hours=1)
+    if level == "day":
+        return start + timedelta(days=1)
+    return start + timedelta(weeks=1)
+
+
+def _chunks(texts, max_chars):
+    """Group texts into runs of at most max_chars (a longer text gets a run of its own)."""
+    chunk, size = [], 0
+    for text in texts:
+        if chunk and size + len(text) > max_chars:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(text)
+        size += len(text) + 1
+    if chunk:
+        yield chunk
+
+
+# ----- Rollup Summarizer -----
+class RollupSummarizer:
+    """Incremental map-reduce summaries of the context stream.
+    
+    A watermark in ContextDB meta records the last context entry that was
+    summarized, so each run only reads entries added since. New entries are
+    summarized per hour (map), folded into that hour's previous rollup
+    (reduce), and the hours of each touched day, and days of each touched
+    week, are merged into day and week rollups. Rollups are stored as
+    context records of type "summary_rollup" with a level and period; a
+    newer rollup for the same period supersedes the older one.
+    
+    complete is an async callable taking a prompt and returning the
+    completion, so the agent decides provider, model and caching. The
+    first run only covers the last first_run_backlog of context (None for
+    the whole history). upstream is extra prompt text for the map step,
+    such as the results of the tasks a summary task depends on.
+    """
+    
+    def __init__(self, context_db, complete, chunk_chars=8000, first_run_backlog=FIRST_RUN_BACKLOG, upstream=""):
+        self.context_db = context_db
+        self.complete = complete
+        self.chunk_chars = chunk_chars
+        self.first_run_backlog = first_run_backlog
+        self.upstream = upstream
+    
+    def pending_entries(self):
+        """Context added since the watermark, oldest first, excluding rollups."""
+        watermark = self.context_db.get_meta(WATERMARK_KEY)
+        if watermark is None:
+            since = datetime.now() - self.first_run_backlog if self.first_run_backlog is not None else ""
+            entries = self.context_db.get_context_since(since)
+        else:
+            # Several entries can share the watermark's timestamp
+            seen = set(watermark["ids"])
+            entries = [entry for entry in self.context_db.get_context_since(watermark["created_at"])
+                       if entry["id"] not in seen]
+        return [entry for entry in entries if entry.get("type") != ROLLUP_TYPE]
+    
+    def get_rollups(self, level):
+        """Current rollups of a level, oldest period first."""
+        index = self.context_db.get_meta(ROLLUPS_KEY, {}).get(level, {})
+        return self.context_db.get_context_entries([index[start] for start in sorted(index)])
+    
+    def latest_rollup(self, level="day"):
+        rollups = self.get_rollups(level)
+        return rollups[-1] if rollups else None
+    
+    async def _summarize(self, texts, period, previous=None):
+        context_text = "\n".join(texts)
+        earlier = f"\nSummary of the earlier entries from this period:\n{previous}\n" if previous else ""
+        return await self.complete(f"""
+Please provide a concise summary of the following context entries from {period}:
+
+{context_text}
+{earlier}{self.upstream}
+Create a clear overview that captures key points and essential information from these entries.
+The summary should be comprehensive yet brief, highlighting the most important aspects.
+""")
+    
+    async def _merge(self, summaries, period):
+        """Reduce partial summaries to one, in rounds that each fit in chunk_chars."""
+        while len(summaries) > 1:
+            rounds = list(_chunks(summaries, self.chunk_chars))
+            if len(rounds) == len(summaries):
+                # Every summary fills a chunk on its own; merge pairwise
+                rounds = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+            summaries = await asyncio.gather(*[self._merge_once(chunk, period) for chunk in rounds])
+        return summaries[0]
+    
+    async def _merge_once(self, summaries, period):
+        if len(summaries) == 1:
+            return summaries[0]
+        parts = "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+        return await self.complete(f"""
+The following are summaries of consecutive parts of the context from {period}:
+
+{parts}
+
+Merge them into a single concise summary of the whole period, keeping the key points and
+essential information and dropping repetition.
+""")
+    
+    async def _roll_hour(self, start, entries, previous):
+        texts = [f"[{entry.get('created_at', '')}] {entry.get('type', 'general')}: {entry.get('content', '')}"
+                 for entry in entries]
+        period = f"the hour starting {start.isoformat(sep=' ', timespec='minutes')}"
+        chunks = list(_chunks(texts, self.chunk_chars))
+        if previous is not None and len(chunks) == 1:
+            # The usual incremental case: extend the hour's summary in one call
+            return await self._summarize(chunks[0], period, previous["content"])
+        partials = await asyncio.gather(*[self._summarize(chunk, period) for chunk in chunks])
+        if previous is not None:
+            partials = [previous["content"]] + list(partials)
+        return await self._merge(list(partials), period)
+    
+    async def _roll_up(self, level, start, children):
+        if len(children) == 1:
+            # Nothing to merge; the child's summary already covers the period
+            return children[0]["content"]
+        label = f"the day of {start.date().isoformat()}" if level == "day" else \
+            f"the week starting {start.date().isoformat()}"
+        return await self._merge([child["content"] for child in children], label)
+    
+    def _record(self, level, start, content, entry_count, previous, task_id):
+        return {
+            "content": content,
+            "type": ROLLUP_TYPE,
+            "level": level,
+            "period_start": start.isoformat(),
+            "period_end": period_end(level, start).isoformat(),
+            "entry_count": entry_count,
+            "supersedes": previous["id"] if previous else None,
+            "task_id": task_id
+        }
+    
+    async def run(self, task_id=None):
+        """Summarize everything added since the last run.
+        
+        Returns the new rollup records, finest level first; an empty list
+        when there was nothing new.
+        """
+        entries = self.pending_entries()
+        if not entries:
+            return []
+        
+        # Copied: the JSON store hands out its live meta values
+        stored_index = self.context_db.get_meta(ROLLUPS_KEY, {})
+        index = {level: dict(stored_index.get(level, {})) for level in LEVELS}
+        
+        def current(level, start):
+            context_id = index[level].get(start.isoformat())
+            found = self.context_db.get_context_entries([context_id]) if context_id else []
+            return found[0] if found else None
+        
+        hours = {}
+        for entry in entries:
+            hours.setdefault(period_start("hour", entry["created_at"]), []).append(entry)
+        
+        # Map: one summary per touched hour, folded into its previous rollup
+        hour_starts = sorted(hours)
+        previous = [current("hour", start) for start in hour_starts]
+        contents = await asyncio.gather(*[self._roll_hour(start, hours[start], prev)
+                                          for start, prev in zip(hour_starts, previous)])
+        records = {"hour": [
+            self._record("hour", start, content, len(hours[start]) + (prev or {}).get("entry_count", 0), prev, task_id)
+            for start, content, prev in zip(hour_starts, contents, previous)
+        ]}
+        
+        # Reduce: rebuild the day and week rollups the new hours belong to
+        for level, child_level in (("day", "hour"), ("week", "day")):
+            fresh = {record["period_start"]: record for record in records[child_level]}
+            parents = sorted({period_start(level, start) for start in fresh})
+            children = {}
+            for parent in parents:
+                # The parent's unchanged children are read back from the store
+                lower, upper = parent.isoformat(), period_end(level, parent).isoformat()
+                stored = [index[child_level][start] for start in sorted(index[child_level])
+                          if lower <= start < upper and start not in fresh]
+                children[parent] = sorted(
+                    self.context_db.get_context_entries(stored) +
+                    [record for start, record in fresh.items() if lower <= start < upper],
+                    key=lambda record: record["period_start"]
+                )
+            
+            contents = await asyncio.gather(*[self._roll_up(level, parent, children[parent]) for parent in parents])
+            records[level] = []
+            for parent, content in zip(parents, contents):
+                prev = current(level, parent)
+                count = sum(child["entry_count"] for child in children[parent])
+                records[level].append(self._record(level, parent, content, count, prev, task_id))
+        
+        # Store the rollups and move the watermark together
+        last = entries[-1]["created_at"]
+        seen = [entry["id"] for entry in entries if entry["created_at"] == last]
+        watermark = self.context_db.get_meta(WATERMARK_KEY)
+        if watermark is not None and watermark["created_at"] == last:
+            seen += watermark["ids"]
+        with self.context_db.batch():
+            created = []
+            for level in LEVELS:
+                for record in records[level]:
+                    context_id = self.context_db.add_context(record)
+                    index[level][record["period_start"]] = context_id
+                    created.append(dict(record, id=context_id))
+                keep = KEEP_PERIODS[level]
+                if keep is not None:
+                    for start in sorted(index[level])[:-keep]:
+                        del index[level][start]
+            self.context_db.set_meta(ROLLUPS_KEY, index)
+            self.context_db.set_meta(WATERMARK_KEY, {"created_at": last, "ids": seen})
+        return created
@@ -0,0 +1,161 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from honeycomb import ContextDB, Agent, AgentPool, TaskCoordinator
+from worker import Worker
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db_path(request, tmp_path):
+    return str(tmp_path / ("db.json" if request.param == "json" else "db.sqlite"))
+
+
+class EchoAgent(Agent):
+    def __init__(self, name, context_db):
+        super().__init__(name, "echo", context_db)
+    
+    async def process_task(self, task):
+        return task["description"]
+
+
+def age_agents(db, seconds):
+    last_seen = (datetime.now() - timedelta(seconds=seconds)).isoformat()
+    for agent in db.get_all_agents():
+        db.update_agent(agent["id"], {"last_seen": last_seen})
+
+
+# ----- Agent records -----
+def test_relaunch_reuses_the_agent_record(db_path):
+    db = ContextDB(db_path, vector_index=False)
+    first = EchoAgent("EchoBot", db)
+    second = EchoAgent("EchoBot", ContextDB(db_path, vector_index=False))
+    assert first.agent_id == second.agent_id
+    assert len(ContextDB(db_path, vector_index=False).get_all_agents()) == 1
+
+
+def test_gc_removes_agents_not_seen(db_path):
+    db = ContextDB(db_path, vector_index=False)
+    coordinator = TaskCoordinator(db, [EchoAgent("EchoBot", db), EchoAgent("OtherBot", db)])
+    age_agents(db, 2 * 60 * 60)
+    assert db.gc_agents(ttl_seconds=60 * 60) == 2
+    assert db.get_all_agents() == []
+    
+    # A heartbeat brings a collected agent back
+    coordinator.heartbeat_agents()
+    assert len(db.get_all_agents()) == 2
+
+
+def test_worker_keeps_idle_agents_alive(db_path):
+    db = ContextDB(db_path, vector_index=False)
+    coordinator = TaskCoordinator(db, [EchoAgent("EchoBot", db)])
+    age_agents(db, 2 * 60 * 60)
+    worker = Worker(db, coordinator, heartbeat_interval=0.05)
+    
+    async def run_briefly():
+        running = asyncio.ensure_future(worker.run())
+        await asyncio.sleep(0.2)
+        worker.stop()
+        await running
+    
+    asyncio.run(run_briefly())
+    assert db.gc_agents(ttl_seconds=60 * 60) == 0
+
+
+# ----- Agent pools -----
+class SlowAgent(Agent):
+    """Sleeps briefly per task and tracks how many of its tasks overlap."""
+    running = 0
+    peak = 0
+    
+    def __init__(self, name, context_db):
+        super().__init__(name, "slow", context_db)
+    
+    async def process_task(self, task):
+        SlowAgent.running += 1
+        SlowAgent.peak = max(SlowAgent.peak, SlowAgent.running)
+        await asyncio.sleep(0.05)
+        SlowAgent.running -= 1
+        return task["description"]
+
+
+def test_pool_dispatch_strategies(tmp_path):
+    db = ContextDB(str(tmp_path / "db.json"), vector_index=False)
+    pool = AgentPool("echo", EchoAgent, "EchoBot", min_size=3)
+    for _ in range(3):
+        pool.spawn(db)
+    assert [agent.name for agent in pool.agents] == ["EchoBot", "EchoBot-2", "EchoBot-3"]
+    
+    # Least loaded spreads tasks, and a released agent is picked again first
+    first, second, third = pool.select(), pool.select(), pool.select()
+    assert len({first.agent_id, second.agent_id, third.agent_id}) == 3
+    pool.release(second)
+    assert pool.select() is second
+    
+    round_robin = AgentPool("echo", strategy="round_robin")
+    for agent in pool.agents:
+        round_robin.add(agent)
+    assert [round_robin.select().name for _ in range(4)] == ["EchoBot", "EchoBot-2", "EchoBot-3", "EchoBot"]
+
+
+def test_pool_scales_with_queue_depth(tmp_path):
+    db = ContextDB(str(tmp_path / "db.json"), vector_index=False)
+    pool = AgentPool("echo", EchoAgent, "EchoBot", min_size=1, max_size=3, tasks_per_agent=2)
+    pool.spawn(db)
+    
+    added, removed = pool.scale(5, db)
+    assert [agent.name for agent in added] == ["EchoBot-2", "EchoBot-3"] and removed == []
+    # A busy agent is not retired
+    busy = pool.select()
+    pool.select()
+    added, removed = pool.scale(0, db)
+    assert added == [] and len(pool) == 2
+    assert busy in pool.agents
+    assert db.get_agent(removed[0].agent_id)["status"] == "offline"
+
+
+def test_specialty_limit_caps_concurrency(tmp_path):
+    db = ContextDB(str(tmp_path / "db.json"), vector_index=False)
+    coordinator = TaskCoordinator(db, max_concurrency=8, specialty_limits={"slow": 2})
+    coordinator.add_pool("slow", SlowAgent, "SlowBot", size=4)
+    task_ids = [coordinator.task_queue.add_task(f"task {i}", "slow") for i in range(6)]
+    SlowAgent.peak = 0
+    
+    asyncio.run(coordinator.process_pending_tasks())
+    assert SlowAgent.peak == 2
+    assert all(db.get_task(task_id)["status"] == "completed" for task_id in task_ids)
+
+
+# ----- Writes per task -----
+class NotingAgent(EchoAgent):
+    def result_context(self, task, result):
+        return {"content": f"Echoed: {result}", "type": "echo_result", "task_id": task["id"]}
+
+
+def test_task_costs_two_flushes(db_path):
+    db = ContextDB(db_path, vector_index=False)
+    coordinator = TaskCoordinator(db, [NotingAgent("EchoBot", db)])
+    task_id = coordinator.task_queue.add_task("hello", "echo")
+    
+    backend = db.backend
+    flushes = []
+    flush = backend.flush
+    
+    def counting_flush():
+        # Flushes with nothing to write cost nothing
+        if hasattr(backend, "conn"):
+            pending = backend.conn.in_transaction
+        else:
+            pending = backend._pending or backend._dirty
+        if pending:
+            flushes.append(1)
+        flush()
+    
+    backend.flush = counting_flush
+    asyncio.run(coordinator.process_pending_tasks())
+    
+    # One to claim the task, one for the result and its context entry
+    assert len(flushes) == 2
+    assert db.get_task(task_id)["result"] == "hello"
+    assert [entry["content"] for entry in db.get_latest_context(5)] == ["Echoed: hello"]
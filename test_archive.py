@@ -0,0 +1,125 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from archive import SegmentArchive, RetentionPolicy, BLOCK_RECORDS
+from honeycomb import ContextDB, TaskQueue
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def records(count, start=0):
+    return [{"id": f"r{i:05d}", "created_at": f"2026-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i:06d}",
+             "content": f"record {i}"} for i in range(start, start + count)]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db_path(request, tmp_path):
+    return str(tmp_path / ("db.json" if request.param == "json" else "db.sqlite"))
+
+
+# ----- Segments -----
+def test_segment_round_trip(tmp_path):
+    archive = SegmentArchive(str(tmp_path / "archive"))
+    archive.write_segment("context", records(BLOCK_RECORDS * 2 + 10))
+    
+    assert archive.count("context") == BLOCK_RECORDS * 2 + 10
+    assert archive.find("context", "r00300")["content"] == "record 300"
+    assert archive.find("context", "missing") is None
+    assert archive.find("tasks", "r00300") is None
+    
+    found = archive.range("context", records(1, 100)[0]["created_at"], records(1, 110)[0]["created_at"])
+    assert [record["id"] for record in found] == [f"r{i:05d}" for i in range(100, 110)]
+    assert [record["id"] for record in archive.latest("context", 3)] == ["r00521", "r00520", "r00519"]
+
+
+def test_other_instance_sees_new_segments(tmp_path):
+    path = str(tmp_path / "archive")
+    reader = SegmentArchive(path)
+    assert reader.find("context", "r00001") is None
+    
+    SegmentArchive(path).write_segment("context", records(5))
+    assert reader.find("context", "r00001")["content"] == "record 1"
+
+
+def test_compaction_merges_small_segments(tmp_path):
+    archive = SegmentArchive(str(tmp_path / "archive"))
+    for start in range(0, 50, 10):
+        archive.write_segment("context", records(10, start))
+    assert len(archive._segments("context")) == 5
+    
+    assert archive.compact("context") == 5
+    segments = archive._segments("context")
+    assert len(segments) == 1
+    assert sorted(os.listdir(archive.path)) == sorted([segments[0]["file"], "manifest.json", ".lock"])
+    assert [record["id"] for record in archive.range("context")] == [f"r{i:05d}" for i in range(50)]
+    assert archive.find("context", "r00042")["content"] == "record 42"
+
+
+def test_reader_survives_compaction_elsewhere(tmp_path):
+    path = str(tmp_path / "archive")
+    reader = SegmentArchive(path)
+    writer = SegmentArchive(path)
+    for start in range(0, 30, 10):
+        writer.write_segment("context", records(10, start))
+    assert reader.count("context") == 30
+    
+    writer.compact("context")
+    assert reader.find("context", "r00005")["content"] == "record 5"
+    assert len(reader.range("context")) == 30
+
+
+# ----- Retention -----
+def test_retention_moves_old_records_out(db_path):
+    db = ContextDB(db_path, vector_index=False, retention=RetentionPolicy(max_context_entries=3, max_finished_tasks=1))
+    queue = TaskQueue(db)
+    context_ids = [db.add_context({"content": f"note {i}", "type": "note"}) for i in range(8)]
+    task_ids = [queue.add_task(f"task {i}", "writing") for i in range(3)]
+    for task_id in task_ids:
+        db.update_task(task_id, {"status": "completed", "result": "done"})
+    
+    assert db.apply_retention() == {"context": 5, "tasks": 2}
+    assert db.archive.count("context") == 5
+    assert [entry["id"] for entry in db.backend.get_latest_context(10)] == context_ids[:-4:-1]
+    # Archived records are still served by ContextDB
+    assert [entry["id"] for entry in db.get_latest_context(10)] == context_ids[::-1]
+    assert [entry["id"] for entry in db.get_context_since("")] == context_ids
+    assert db.get_task(task_ids[0])["result"] == "done"
+    
+    # Nothing left to move
+    assert db.apply_retention() == {"context": 0, "tasks": 0}
+    assert db.archive.count("context") == 5
+
+
+RETAINER = """
+import os
+import sys
+import time
+from archive import RetentionPolicy
+from honeycomb import ContextDB
+db = ContextDB(sys.argv[1], vector_index=False, retention=RetentionPolicy(max_context_entries=3))
+while not os.path.exists(sys.argv[2]):
+    time.sleep(0.001)
+print(db.apply_retention()["context"])
+db.close()
+"""
+
+
+def test_concurrent_retention_archives_each_record_once(db_path, tmp_path):
+    db = ContextDB(db_path, vector_index=False)
+    context_ids = [db.add_context({"content": f"note {i}", "type": "note"}) for i in range(40)]
+    db.close()
+    
+    go = str(tmp_path / "go")
+    workers = [subprocess.Popen([sys.executable, "-c", RETAINER, db_path, go], cwd=REPO_DIR,
+                                stdout=subprocess.PIPE, text=True) for _ in range(3)]
+    open(go, 'w').close()
+    moved = [int(worker.communicate(timeout=60)[0]) for worker in workers]
+    
+    # Whichever process ran first moved everything; the others found nothing left
+    assert sorted(moved) == [0, 0, 37]
+    reopened = ContextDB(db_path, vector_index=False)
+    assert reopened.archive.count("context") == 37
+    assert [entry["id"] for entry in reopened.get_context_since("")] == context_ids
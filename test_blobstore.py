@@ -0,0 +1,50 @@
+import os
+
+from blobstore import BlobStore, preview, ZLIB
+from honeycomb import ContextDB, TaskQueue
+
+
+def blob_files(root):
+    return [os.path.join(folder, name) for folder, _, names in os.walk(root) for name in names]
+
+
+def test_equal_values_are_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    text = "a long result " * 100
+    ref = store.put(text)
+    assert store.put(text) == ref
+    assert ref["kind"] == "text" and ref["size"] == len(text)
+    assert len(blob_files(store.root)) == 1
+    # Repetitive text is compressed on disk
+    with open(blob_files(store.root)[0], 'rb') as f:
+        assert f.read(1) == ZLIB
+    assert BlobStore(store.root).get(ref) == text
+
+
+def test_json_values_round_trip(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"))
+    value = {"stdout": "x" * 2000, "exit_code": 0}
+    ref = store.put(value)
+    assert ref["kind"] == "json"
+    assert BlobStore(store.root).get(ref) == value
+
+
+def test_preview_keeps_scalars():
+    assert preview("x" * 300, 10) == "x" * 10 + "..."
+    assert preview({"stdout": "y" * 300, "exit_code": 1, "lines": [1, 2]}, 5) == {"stdout": "yyyyy...", "exit_code": 1}
+
+
+def test_large_results_move_out_of_the_task_record(tmp_path):
+    db = ContextDB(str(tmp_path / "db.json"), vector_index=False, blob_threshold=100)
+    queue = TaskQueue(db)
+    small_id = queue.add_task("small", "writing")
+    large_id = queue.add_task("large", "writing")
+    assert queue.assign_task(small_id, "agent-1") and queue.assign_task(large_id, "agent-1")
+    queue.complete_task(small_id, "short")
+    queue.complete_task(large_id, "z" * 1000)
+    
+    assert db.get_task(small_id)["result"] == "short"
+    large = db.get_task(large_id)
+    assert "result" not in large or large["result"] is None
+    assert large["result_preview"] == "z" * 200 + "..."
+    assert db.get_task_result(large) == "z" * 1000
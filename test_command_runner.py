@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+import pytest
+
+from command_runner import run_command, StreamCapture, ProcessPool
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses a POSIX shell")
+
+
+def run(command, **kwargs):
+    return asyncio.run(run_command(command, **kwargs))
+
+
+# ----- Output capture -----
+def test_capture_keeps_head_and_tail():
+    capture = StreamCapture(head_bytes=4, tail_bytes=4)
+    for piece in (b"abc", b"defgh", b"ijkl\n"):
+        capture.feed(piece)
+    assert capture.total_bytes == 13 and capture.lines == 1
+    assert capture.text() == "abcd\n... [5 bytes omitted] ...\njkl\n"
+
+
+def test_full_output_is_spilled_to_disk(tmp_path):
+    result = run("seq 1 20000", head_bytes=16, tail_bytes=16, spill_dir=str(tmp_path), spill_name="task")
+    assert result["return_code"] == 0
+    assert result["lines"] == 20000
+    assert result["stdout"].startswith("1\n2\n") and result["stdout"].endswith("19999\n20000\n")
+    assert "bytes omitted" in result["stdout"]
+    with open(result["output_files"]["stdout"]) as f:
+        assert f.read().count("\n") == 20000
+
+
+# ----- Limits -----
+def test_byte_limit_kills_the_command():
+    result = run("yes", max_bytes=1024 * 1024)
+    assert result["limit_exceeded"] == "bytes"
+    assert result["return_code"] != 0
+
+
+def test_line_limit_kills_the_command():
+    result = run("seq 1 1000000", max_lines=100)
+    assert result["limit_exceeded"] == "lines"
+    assert result["lines"] < 1000000
+
+
+def test_timeout_kills_child_processes(tmp_path):
+    marker = tmp_path / "survived"
+    started = time.monotonic()
+    result = run(f"(sleep 2; touch {marker}) & sleep 30", timeout=0.5)
+    assert result["limit_exceeded"] == "timeout"
+    assert time.monotonic() - started < 5
+    # The background child was in the killed process group
+    time.sleep(2.5)
+    assert not os.path.exists(marker)
+
+
+# ----- Process pool -----
+def test_pool_caps_concurrent_commands():
+    pool = ProcessPool(max_concurrency=2)
+    
+    async def run_all():
+        return await asyncio.gather(*[pool.run("sleep 0.3") for _ in range(4)])
+    
+    started = time.monotonic()
+    results = asyncio.run(run_all())
+    # Two rounds of two
+    assert time.monotonic() - started >= 0.6
+    assert sorted(result["queued_for"] > 0.2 for result in results) == [False, False, True, True]
+    stats = pool.get_stats()
+    assert stats["completed"] == 4 and stats["running"] == 0 and stats["queued"] == 0
+
+
+def test_pool_applies_rlimits():
+    pool = ProcessPool(rlimits={"open_files": 64})
+    assert asyncio.run(pool.run("ulimit -n"))["stdout"].strip() == "64"
+    # A task's rlimits override the pool's, and None leaves a limit alone
+    assert asyncio.run(pool.run("ulimit -n", rlimits={"open_files": 32}))["stdout"].strip() == "32"
+    inherited = subprocess.run("ulimit -t", shell=True, capture_output=True, text=True).stdout
+    assert asyncio.run(pool.run("ulimit -t", rlimits={"cpu_seconds": None}))["stdout"] == inherited
@@ -0,0 +1,45 @@
+import pytest
+
+from honeycomb import ContextDB
+from context_assembler import ContextAssembler, estimate_tokens
+
+
+@pytest.fixture
+def db(tmp_path):
+    pytest.importorskip("numpy")
+    return ContextDB(str(tmp_path / "db.json"))
+
+
+def test_off_topic_context_is_left_out(db):
+    db.add_context({"content": "How to schedule async tasks in Python", "type": "note"})
+    db.add_context({"content": "The quarterly marketing budget for the bakery", "type": "note"})
+    db.add_context({"content": "Notes on sourdough bread fermentation", "type": "note"})
+    
+    text = db.assembler.assemble("schedule python async tasks")
+    assert "schedule async tasks" in text
+    assert "bakery" not in text and "sourdough" not in text
+    # Nothing related at all: no context rather than the nearest noise
+    assert db.assembler.assemble("weather in paris today") == ""
+
+
+def test_budget_and_entry_cap(db):
+    for i in range(10):
+        db.add_context({"content": f"python task scheduling note {i}. " * 30, "type": "note"})
+    
+    assembler = ContextAssembler(db, token_budget=300, max_entry_tokens=100)
+    text = assembler.assemble("python task scheduling")
+    assert estimate_tokens(text) <= 300
+    # Each entry is cut to about 100 tokens plus the "..." marker
+    assert all(part.endswith(" ...") and estimate_tokens(part) <= 103 for part in text.split("\n"))
+    assert len(text.split("\n")) >= 2
+
+
+def test_blocks_are_cached_until_context_changes(db):
+    db.add_context({"content": "python task scheduling", "type": "note"})
+    db.assembler.assemble("python tasks")
+    db.assembler.assemble("python tasks")
+    assert db.assembler.get_stats()["hits"] == 1
+    
+    db.add_context({"content": "more about python tasks", "type": "note"})
+    assert "more about python tasks" in db.assembler.assemble("python tasks")
+    assert db.assembler.get_stats()["misses"] == 2
@@ -0,0 +1,52 @@
+import os
+
+from honeycomb import ContextDB, TaskQueue
+
+
+def open_db(db_path):
+    return ContextDB(db_path, vector_index=False)
+
+
+def test_journal_replays_after_crash(tmp_path):
+    db_path = str(tmp_path / "db.json")
+    db = open_db(db_path)
+    queue = TaskQueue(db)
+    task_id = queue.add_task("Write a haiku", "writing")
+    db.add_context({"content": "some context", "type": "note"})
+    # No close(): the records only exist in the journal
+    assert os.path.getsize(db_path + ".log") > 0
+    
+    reopened = open_db(db_path)
+    assert reopened.get_task(task_id)["description"] == "Write a haiku"
+    assert [entry["content"] for entry in reopened.get_latest_context(5)] == ["some context"]
+
+
+def test_journal_truncates_torn_write(tmp_path):
+    db_path = str(tmp_path / "db.json")
+    db = open_db(db_path)
+    task_id = TaskQueue(db).add_task("Write a haiku", "writing")
+    good_size = os.path.getsize(db_path + ".log")
+    with open(db_path + ".log", 'ab') as f:
+        f.write(b'{"seq": 99, "op": "insert_task", "rec')
+    
+    reopened = open_db(db_path)
+    assert reopened.get_task(task_id)["status"] == "pending"
+    # The torn entry is cut off by the next writer, which appends in its place
+    other_id = TaskQueue(reopened).add_task("Write a limerick", "writing")
+    with open(db_path + ".log", 'rb') as f:
+        f.seek(good_size)
+        assert f.read(1) == b"{"
+        assert b'"rec{' not in f.read()
+    replayed = open_db(db_path)
+    assert replayed.get_task(task_id) is not None
+    assert replayed.get_task(other_id) is not None
+
+
+def test_snapshot_replaces_the_journal(tmp_path):
+    db_path = str(tmp_path / "db.json")
+    db = open_db(db_path)
+    task_id = TaskQueue(db).add_task("Write a haiku", "writing")
+    db.close()
+    # Closing folds the journal into the snapshot
+    assert not os.path.exists(db_path + ".log") or os.path.getsize(db_path + ".log") == 0
+    assert open_db(db_path).get_task(task_id)["description"] == "Write a haiku"
@@ -0,0 +1,67 @@
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from honeycomb import ContextDB, TaskQueue
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db_path(request, tmp_path):
+    return str(tmp_path / ("db.json" if request.param == "json" else "db.sqlite"))
+
+
+def open_db(db_path):
+    return ContextDB(db_path, vector_index=False)
+
+
+def test_expired_lease_is_reclaimed(db_path):
+    owner = TaskQueue(open_db(db_path), lease_seconds=1, max_attempts=2)
+    other_db = open_db(db_path)
+    other = TaskQueue(other_db, lease_seconds=1, max_attempts=2)
+    task_id = owner.add_task("Write a haiku", "writing")
+    assert owner.assign_task(task_id, "agent-1", owner.context_db.get_task(task_id)["version"])
+    
+    other_db.poll_changes()
+    assert not other.complete_task(task_id, "not my lease")
+    assert other.reclaim_expired() == 0
+    
+    time.sleep(1.2)
+    other_db.poll_changes()
+    assert other.reclaim_expired() == 1
+    task = other_db.get_task(task_id)
+    assert task["status"] == "pending"
+    assert task["attempts"] == 1
+    # The original owner lost the task and cannot finish it
+    assert not owner.complete_task(task_id, "too late")
+
+
+def test_heartbeat_keeps_lease(db_path):
+    db = open_db(db_path)
+    queue = TaskQueue(db, lease_seconds=1)
+    task_id = queue.add_task("Write a haiku", "writing")
+    assert queue.assign_task(task_id, "agent-1", db.get_task(task_id)["version"])
+    
+    async def hold():
+        async with queue.lease_heartbeat(task_id):
+            await asyncio.sleep(1.5)
+    
+    asyncio.run(hold())
+    assert queue.reclaim_expired() == 0
+    assert queue.complete_task(task_id, "done")
+    assert db.get_task(task_id)["status"] == "completed"
+
+
+def test_lease_times_are_utc(db_path):
+    db = open_db(db_path)
+    queue = TaskQueue(db, lease_seconds=60)
+    task_id = queue.add_task("Write a haiku", "writing")
+    assert queue.assign_task(task_id, "agent-1", db.get_task(task_id)["version"])
+    assert datetime.fromisoformat(db.get_task(task_id)["lease_expires_at"]).utcoffset() == timedelta(0)
+    
+    # A lease written in local time by an older version is still read correctly
+    stale = (datetime.now() - timedelta(seconds=5)).isoformat()
+    assert db.update_task(task_id, {"lease_expires_at": stale})
+    assert queue.reclaim_expired() == 1
+    assert db.get_task(task_id)["status"] == "pending"
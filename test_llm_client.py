@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+import requests
+
+import llm_client
+from llm_client import (LLMClient, RateLimitError, ServerError, BadRequestError, AuthenticationError,
+                        MissingAPIKeyError, LLMTimeoutError)
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = str(body)
+    
+    def json(self):
+        return self.body
+
+
+def ok(content):
+    return FakeResponse(200, {"choices": [{"message": {"content": content}}]})
+
+
+class ScriptedTransport:
+    """Returns (or raises) the scripted outcomes in order."""
+    
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+    
+    async def post(self, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def complete(*outcomes, **kwargs):
+    transport = ScriptedTransport(*outcomes)
+    client = LLMClient(transport=transport, backoff_base=0, openai_api_key="key", **kwargs)
+    return transport, asyncio.run(client.complete("Write a haiku"))
+
+
+# ----- Retries -----
+def test_transient_failures_are_retried():
+    transport, content = complete(FakeResponse(429, "slow down", {"Retry-After": "0"}),
+                                  FakeResponse(503, "unavailable"), requests.Timeout(), ok("a haiku"))
+    assert content == "a haiku"
+    assert transport.calls == 4
+
+
+def test_retries_give_up_after_max_retries():
+    with pytest.raises(ServerError) as raised:
+        complete(*[FakeResponse(500, "boom")] * 3, max_retries=2)
+    assert raised.value.status_code == 500
+
+
+def test_timeouts_map_to_llm_timeout_error():
+    with pytest.raises(LLMTimeoutError):
+        complete(requests.Timeout(), max_retries=0)
+
+
+# ----- Error mapping -----
+@pytest.mark.parametrize("status, error", [(400, BadRequestError), (401, AuthenticationError),
+                                           (403, AuthenticationError)])
+def test_client_errors_fail_at_once(status, error):
+    transport = ScriptedTransport(FakeResponse(status, "nope"), ok("unused"))
+    client = LLMClient(transport=transport, backoff_base=0, openai_api_key="key")
+    with pytest.raises(error):
+        asyncio.run(client.complete("Write a haiku"))
+    assert transport.calls == 1
+
+
+def test_rate_limit_carries_retry_after():
+    with pytest.raises(RateLimitError) as raised:
+        complete(FakeResponse(429, "slow down", {"Retry-After": "7"}), max_retries=0)
+    assert raised.value.retry_after == 7.0
+
+
+def test_missing_key_fails_without_a_request():
+    transport = ScriptedTransport(ok("unused"))
+    client = LLMClient(transport=transport, openai_api_key="", anthropic_api_key="")
+    assert not client.has_key("openai")
+    with pytest.raises(MissingAPIKeyError):
+        asyncio.run(client.complete("Write a haiku"))
+    assert transport.calls == 0
+
+
+def test_timeout_comes_from_the_environment(monkeypatch):
+    monkeypatch.setattr(llm_client, "_client", None)
+    monkeypatch.setenv("HONEYCOMB_LLM_CACHE", "")
+    monkeypatch.setenv("HONEYCOMB_LLM_TIMEOUT", "5")
+    assert llm_client.get_client().timeout == 5.0
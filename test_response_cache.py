@@ -0,0 +1,96 @@
+import asyncio
+
+import agents
+from llm_client import LLMClient
+from response_cache import ResponseCache
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+    text = ""
+    
+    def __init__(self, content):
+        self.content = content
+    
+    def json(self):
+        return {"choices": [{"message": {"content": self.content}}]}
+
+
+class FakeTransport:
+    """Answers every request with a numbered completion."""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    async def post(self, url, **kwargs):
+        self.calls += 1
+        return FakeResponse(f"answer {self.calls}")
+
+
+def make_client(tmp_path):
+    return LLMClient(transport=FakeTransport(), openai_api_key="key",
+                     cache=ResponseCache(str(tmp_path / "cache.sqlite")))
+
+
+# ----- Response cache -----
+def test_entries_survive_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    cache.put("key", "value", "writing")
+    cache.close()
+    
+    reopened = ResponseCache(path)
+    assert reopened.get("key") == "value"
+    assert reopened.get_stats()["disk_hits"] == 1
+    assert reopened.get("missing") is None
+
+
+def test_entries_expire_per_task_type(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttls={"research": 0})
+    cache.put("research", "stale", "research")
+    cache.put("writing", "fresh", "writing")
+    assert cache.get("research") is None
+    assert cache.get("writing") == "fresh"
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    for i in range(3):
+        cache.put(f"key {i}", i)
+    assert cache.get_stats()["memory_entries"] == 2
+    # The evicted entry is still on disk
+    assert cache.get("key 0") == 0
+    assert cache.get_stats()["disk_hits"] == 1
+
+
+# ----- Cache keys -----
+def test_prompt_change_misses_unless_cache_inputs_match(tmp_path):
+    client = make_client(tmp_path)
+    assert asyncio.run(client.complete("prompt one")) == "answer 1"
+    assert asyncio.run(client.complete("prompt one")) == "answer 1"
+    assert asyncio.run(client.complete("prompt two")) == "answer 2"
+    
+    inputs = {"description": "Write a haiku"}
+    assert asyncio.run(client.complete("haiku, context A", cache_inputs=inputs)) == "answer 3"
+    assert asyncio.run(client.complete("haiku, context B", cache_inputs=inputs)) == "answer 3"
+    # Sampling parameters are still part of the key
+    assert asyncio.run(client.complete("haiku, context B", temperature=0.1, cache_inputs=inputs)) == "answer 4"
+    assert client.transport.calls == 4
+
+
+def test_tasks_are_keyed_on_the_prompt_by_default(tmp_path, monkeypatch):
+    client = make_client(tmp_path)
+    monkeypatch.setattr(agents, "get_client", lambda: client)
+    task = {"id": "t1", "type": "writing", "description": "Write a haiku", "params": {"stream": False}}
+    
+    def run(task, prompt):
+        return asyncio.run(agents.complete_streaming(None, task, prompt))
+    
+    assert run(task, "haiku, context A") == "answer 1"
+    # New context in the prompt means a new answer
+    assert run(task, "haiku, context B") == "answer 2"
+    
+    by_task = dict(task, params={"stream": False, "cache_by_task": True})
+    assert run(by_task, "haiku, context C") == "answer 3"
+    assert run(by_task, "haiku, context D") == "answer 3"
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import Scheduler
+
+START = datetime(2026, 1, 1, 12, 0)
+
+
+def task(task_id, minutes=0, priority=0, deadline=None):
+    return {"id": task_id, "created_at": (START + timedelta(minutes=minutes)).isoformat(), "priority": priority,
+            "deadline": deadline.isoformat() if deadline else None}
+
+
+def drain(scheduler):
+    order = []
+    task_id = scheduler.pop()
+    while task_id is not None:
+        order.append(task_id)
+        task_id = scheduler.pop()
+    return order
+
+
+def test_priority_then_fifo():
+    scheduler = Scheduler()
+    for queued in [task("low", 0), task("high", 1, priority=5), task("low-later", 2)]:
+        scheduler.push(queued)
+    assert drain(scheduler) == ["high", "low", "low-later"]
+
+
+def test_waiting_tasks_age_past_newer_urgent_ones():
+    scheduler = Scheduler(aging_per_minute=1.0)
+    scheduler.push(task("bulk", 0))
+    # Ten minutes later a priority-5 task is still behind the bulk task's ten points of age
+    scheduler.push(task("urgent", 10, priority=5))
+    assert drain(scheduler) == ["bulk", "urgent"]
+
+
+def test_edf_runs_the_earliest_deadline_first():
+    scheduler = Scheduler(policy="edf")
+    scheduler.push(task("none", 0, priority=9))
+    scheduler.push(task("late", 1, deadline=START + timedelta(hours=2)))
+    scheduler.push(task("soon", 2, deadline=START + timedelta(hours=1)))
+    assert drain(scheduler) == ["soon", "late", "none"]
+    with pytest.raises(ValueError):
+        Scheduler(policy="random")
+
+
+def test_sync_adds_requeues_and_drops():
+    scheduler = Scheduler()
+    scheduler.sync([task("a", 0), task("b", 1)])
+    assert len(scheduler) == 2
+    
+    # "a" is gone from the store, "b" was reprioritised, "c" is new
+    scheduler.sync([task("b", 1, priority=3), task("c", 2)])
+    assert len(scheduler) == 2
+    assert drain(scheduler) == ["b", "c"]
+
+
+def test_bad_deadline_does_not_break_the_queue():
+    scheduler = Scheduler()
+    scheduler.push(dict(task("bad", 0), deadline="tomorrow"))
+    scheduler.push(task("good", 1))
+    assert drain(scheduler) == ["bad", "good"]
@@ -0,0 +1,77 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from honeycomb import ContextDB, TaskQueue
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db_path(request, tmp_path):
+    return str(tmp_path / ("db.json" if request.param == "json" else "db.sqlite"))
+
+
+def open_db(db_path):
+    return ContextDB(db_path, vector_index=False)
+
+
+# ----- Versions -----
+def test_update_task_checks_version(db_path):
+    db = open_db(db_path)
+    task_id = TaskQueue(db).add_task("Write a haiku", "writing")
+    version = db.get_task(task_id)["version"]
+    
+    assert db.update_task(task_id, {"status": "assigned"}, version)
+    assert not db.update_task(task_id, {"status": "completed"}, version)
+    task = db.get_task(task_id)
+    assert task["status"] == "assigned"
+    assert task["version"] == version + 1
+    # Without an expected version the update always applies
+    assert db.update_task(task_id, {"status": "completed"})
+
+
+# ----- Multiple processes -----
+WRITER = """
+import sys
+from honeycomb import ContextDB, TaskQueue
+db = ContextDB(sys.argv[1], vector_index=False)
+print(TaskQueue(db).add_task("From another process", "writing"))
+db.add_context({"content": "written elsewhere", "type": "note"})
+db.close()
+"""
+
+
+def test_catches_up_with_other_process(db_path):
+    db = open_db(db_path)
+    local_id = TaskQueue(db).add_task("Write a haiku", "writing")
+    
+    result = subprocess.run([sys.executable, "-c", WRITER, db_path], cwd=REPO_DIR, capture_output=True,
+                            text=True, check=True)
+    remote_id = result.stdout.strip()
+    
+    db.poll_changes()
+    assert db.get_task(remote_id)["description"] == "From another process"
+    assert db.get_task(local_id) is not None
+    assert "written elsewhere" in [entry["content"] for entry in db.get_latest_context(5)]
+    # Writes after catching up land alongside the other process's
+    assert db.update_task(remote_id, {"status": "assigned"}, db.get_task(remote_id)["version"])
+    assert open_db(db_path).get_task(remote_id)["status"] == "assigned"
+
+
+def test_stores_do_not_share_transactions(tmp_path):
+    db_path = str(tmp_path / "db.sqlite")
+    first = open_db(db_path)
+    second = open_db(db_path)
+    assert first.backend.conn is not second.backend.conn
+    
+    task_id = TaskQueue(first).add_task("Write a haiku", "writing")
+    with first.batch():
+        first.update_task(task_id, {"status": "assigned"})
+        # Not committed yet, and nothing the other store does can commit it
+        assert second.get_task(task_id)["status"] == "pending"
+    assert second.get_task(task_id)["status"] == "assigned"
+    first.close()
+    first.close()
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from honeycomb import ContextDB
+from summarizer import RollupSummarizer, WATERMARK_KEY
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db_path(request, tmp_path):
+    return str(tmp_path / ("db.json" if request.param == "json" else "db.sqlite"))
+
+
+class FakeModel:
+    """Records prompts and answers each with a numbered summary."""
+    
+    def __init__(self):
+        self.prompts = []
+    
+    async def complete(self, prompt):
+        self.prompts.append(prompt)
+        return f"summary {len(self.prompts)}"
+
+
+def test_rollups_cover_only_new_context(db_path):
+    db = ContextDB(db_path, vector_index=False)
+    model = FakeModel()
+    summarizer = RollupSummarizer(db, model.complete)
+    for i in range(3):
+        db.add_context({"content": f"note {i}", "type": "note"})
+    
+    created = asyncio.run(summarizer.run("task-1"))
+    assert [record["level"] for record in created] == ["hour", "day", "week"]
+    assert len(model.prompts) == 1
+    assert all(f"note {i}" in model.prompts[0] for i in range(3))
+    assert summarizer.latest_rollup("day")["content"] == "summary 1"
+    assert summarizer.latest_rollup("day")["entry_count"] == 3
+    
+    # Nothing new: no calls, no rollups
+    assert asyncio.run(summarizer.run("task-2")) == []
+    assert len(model.prompts) == 1
+    
+    # The next run reads only the new entry and extends the hour's summary
+    new_id = db.add_context({"content": "note 3", "type": "note"})
+    created = asyncio.run(summarizer.run("task-3"))
+    assert "note 3" in model.prompts[1] and "note 0" not in model.prompts[1]
+    assert "summary 1" in model.prompts[1]
+    assert created[0]["supersedes"] is not None
+    assert summarizer.latest_rollup("day")["entry_count"] == 4
+    assert db.get_meta(WATERMARK_KEY)["ids"] == [new_id]
+
+
+def test_upstream_results_reach_the_prompt(db_path):
+    db = ContextDB(db_path, vector_index=False)
+    model = FakeModel()
+    db.add_context({"content": "note", "type": "note"})
+    
+    asyncio.run(RollupSummarizer(db, model.complete, upstream="\nUpstream: the research notes\n").run())
+    assert "Upstream: the research notes" in model.prompts[0]
@@ -0,0 +1,66 @@
+import asyncio
+
+from honeycomb import ContextDB, Agent, TaskCoordinator
+
+
+class GraphAgent(Agent):
+    """Echoes its task and the upstream results it got; fails tasks named "fail"."""
+    running = 0
+    peak = 0
+    
+    def __init__(self, name, context_db):
+        super().__init__(name, "graph", context_db)
+    
+    async def process_task(self, task):
+        GraphAgent.running += 1
+        GraphAgent.peak = max(GraphAgent.peak, GraphAgent.running)
+        await asyncio.sleep(0.05)
+        GraphAgent.running -= 1
+        if task["description"] == "fail":
+            raise RuntimeError("failed on purpose")
+        upstream = sorted(entry["result"] for entry in (task.get("upstream_results") or {}).values())
+        return "+".join(upstream + [task["description"]])
+
+
+def make_coordinator(tmp_path):
+    db = ContextDB(str(tmp_path / "db.json"), vector_index=False)
+    coordinator = TaskCoordinator(db)
+    coordinator.add_pool("graph", GraphAgent, "GraphBot", size=4)
+    GraphAgent.peak = 0
+    return db, coordinator
+
+
+def test_diamond_runs_branches_together(tmp_path):
+    db, coordinator = make_coordinator(tmp_path)
+    queue = coordinator.task_queue
+    a = queue.add_task("a", "graph")
+    b = queue.add_task("b", "graph", depends_on=[a])
+    c = queue.add_task("c", "graph", depends_on=[a])
+    d = queue.add_task("d", "graph", depends_on=[b, c])
+    assert db.get_task(d)["status"] == "waiting"
+    
+    asyncio.run(coordinator.process_pending_tasks())
+    assert db.get_task(d)["status"] == "completed"
+    assert db.get_task(d)["result"] == "a+b+a+c+d"
+    # b and c ran side by side
+    assert GraphAgent.peak == 2
+
+
+def test_failure_fails_everything_downstream(tmp_path):
+    db, coordinator = make_coordinator(tmp_path)
+    queue = coordinator.task_queue
+    a = queue.add_task("fail", "graph")
+    b = queue.add_task("b", "graph", depends_on=[a])
+    c = queue.add_task("c", "graph", depends_on=[b])
+    other = queue.add_task("other", "graph")
+    
+    asyncio.run(coordinator.process_pending_tasks())
+    assert db.get_task(a)["status"] == "failed"
+    for task_id in (b, c):
+        task = db.get_task(task_id)
+        assert task["status"] == "failed" and task["error_type"] == "UpstreamFailed"
+    assert db.get_task(other)["status"] == "completed"
+    
+    # A task added after its dependency failed fails straight away
+    late = queue.add_task("late", "graph", depends_on=[a])
+    assert db.get_task(late)["status"] == "failed"
@@ -0,0 +1,56 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from honeycomb import ContextDB
+from vector_index import VectorIndex
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def db_path(request, tmp_path):
+    return str(tmp_path / ("db.json" if request.param == "json" else "db.sqlite"))
+
+
+# ----- Vector index -----
+def test_search_ranks_by_similarity(tmp_path):
+    index = VectorIndex(str(tmp_path / "vectors"))
+    index.add(["python", "bread", "budget"], ["How to schedule async tasks in Python",
+                                             "Notes on sourdough bread fermentation",
+                                             "The quarterly marketing budget"])
+    assert index.add(["python"], ["already indexed"]) == 0
+    results = index.search("schedule python async tasks", 2)
+    assert [record_id for record_id, _ in results][0] == "python"
+    assert results[0][1] > results[1][1]
+
+
+def test_other_instances_see_appended_rows(tmp_path):
+    path = str(tmp_path / "vectors")
+    reader = VectorIndex(path)
+    VectorIndex(path).add(["python"], ["How to schedule async tasks in Python"])
+    assert reader.search("python tasks", 1)[0][0] == "python"
+    assert len(VectorIndex(path)) == 1
+
+
+# ----- Relevant context -----
+def test_query_indexes_context_written_without_an_index(db_path):
+    db = ContextDB(db_path)
+    db.add_context({"content": "Notes on sourdough bread fermentation", "type": "note"})
+    assert db.get_relevant_context("sourdough bread", 1)[0]["content"].startswith("Notes on sourdough")
+    
+    # Written after this process's first query by one that keeps no index
+    other = ContextDB(db_path, vector_index=False)
+    other.add_context({"content": "How to schedule async tasks in Python", "type": "note"})
+    other.close()
+    db.poll_changes()
+    assert db.get_relevant_context("schedule python async tasks", 1)[0]["content"].startswith("How to schedule")
+
+
+def test_existing_store_is_indexed_on_first_query(db_path):
+    db = ContextDB(db_path, vector_index=False)
+    for topic in ("sourdough bread", "python asyncio", "marketing budget"):
+        db.add_context({"content": f"Notes on {topic}", "type": "note"})
+    db.close()
+    
+    indexed = ContextDB(db_path)
+    assert [entry["content"] for entry in indexed.get_relevant_context("python asyncio", 1)] == ["Notes on python asyncio"]
+    assert len(indexed.vectors) == 3
@@ -0,0 +1,144 @@
+import os
+import re
+import zlib
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+# ----- Embedding -----
+class HashedNgramEmbedder:
+    """Cheap local text embedding: hashed word and character n-gram counts.
+    
+    Features are hashed with crc32 rather than hash() so vectors are
+    stable across processes and restarts.
+    """
+    
+    def __init__(self, dim=256, char_ngrams=3):
+        self.dim = dim
+        self.char_ngrams = char_ngrams
+    
+    def _features(self, text):
+        words = TOKEN_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            features.extend(padded[i:i + self.char_ngrams] for i in range(len(padded) - self.char_ngrams + 1))
+        return features
+    
+    def embed(self, texts):
+        """Return an L2-normalised float32 matrix with one row per text."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                bucket = zlib.crc32(feature.encode())
+                # The top hash bit picks a sign so collisions tend to cancel
+                matrix[row, bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+# ----- Vector Index -----
+class VectorIndex:
+    """Brute-force cosine index over an in-memory NumPy matrix.
+    
+    Rows are persisted to an append-only file of fixed-size records
+    (36-byte id + vector), so adding an entry costs one small append and
+    loading is a single np.fromfile. Other processes' appends are picked
+    up on the next search.
+    """
+    
+    def __init__(self, path, dim=256, embedder=None):
+        self.path = path
+        self.embedder = embedder or HashedNgramEmbedder(dim)
+        self.dim = self.embedder.dim
+        self.record_dtype = np.dtype([("id", "S36"), ("vector", "<f4", (self.dim,))])
+        self.lock = threading.Lock()
+        self.vectors = np.zeros((1024, self.dim), dtype=np.float32)
+        self.ids = []
+        self.id_set = set()
+        self._file_rows = 0
+        self._catch_up()
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def _append_rows(self, ids, vectors):
+        needed = len(self.ids) + len(ids)
+        if needed > len(self.vectors):
+            grown = np.zeros((max(needed, 2 * len(self.vectors)), self.dim), dtype=np.float32)
+            grown[:len(self.ids)] = self.vectors[:len(self.ids)]
+            self.vectors = grown
+        self.vectors[len(self.ids):needed] = vectors
+        self.ids.extend(ids)
+        self.id_set.update(ids)
+    
+    def _catch_up(self):
+        """Load rows appended to the file since we last read it."""
+        if not os.path.exists(self.path):
+            return
+        rows = os.path.getsize(self.path) // self.record_dtype.itemsize
+        if rows <= self._file_rows:
+            return
+        records = np.fromfile(self.path, dtype=self.record_dtype, count=rows - self._file_rows,
+                              offset=self._file_rows * self.record_dtype.itemsize)
+        self._file_rows = rows
+        ids = records["id"].astype(str).tolist()
+        fresh = [i for i, record_id in enumerate(ids) if record_id not in self.id_set]
+        if fresh:
+            self._append_rows([ids[i] for i in fresh], records["vector"][fresh])
+    
+    def add(self, ids, texts):
+        """Embed and index a batch of entries, skipping ids already present."""
+        with self.lock:
+            self._catch_up()
+            pairs = [(record_id, text) for record_id, text in zip(ids, texts) if record_id not in self.id_set]
+            if not pairs:
+                return 0
+            new_ids = [record_id for record_id, _ in pairs]
+            vectors = self.embedder.embed([text for _, text in pairs])
+            
+            records = np.zeros(len(new_ids), dtype=self.record_dtype)
+            records["id"] = [record_id.encode() for record_id in new_ids]
+            records["vector"] = vectors
+            with open(self.path, 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                # Another process may have appended since the check above;
+                # read its rows first so _file_rows stays in step with the file
+                self._catch_up()
+                records.tofile(f)
+                f.flush()
+                self._file_rows = os.fstat(f.fileno()).st_size // self.record_dtype.itemsize
+            self._append_rows(new_ids, vectors)
+            return len(new_ids)
+    
+    def search(self, query, k=5):
+        return self.search_batch([query], k)[0]
+    
+    def search_batch(self, queries, k=5):
+        """Top-k (id, score) pairs per query, best first."""
+        with self.lock:
+            self._catch_up()
+            count = len(self.ids)
+            if not count or not queries:
+                return [[] for _ in queries]
+            
+            query_vectors = self.embedder.embed(queries)
+            scores = self.vectors[:count] @ query_vectors.T
+            k = min(k, count)
+            results = []
+            for column in range(len(queries)):
+                column_scores = scores[:, column]
+                top = np.argpartition(-column_scores, k - 1)[:k]
+                top = top[np.argsort(-column_scores[top])]
+                results.append([(self.ids[i], float(column_scores[i])) for i in top])
+            return results
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Headless honeycomb worker: runs tasks continuously as they are added."""
+import sys
+import signal
+import asyncio
+import argparse
+from datetime import datetime
+
+from honeycomb import ContextDB, create_coordinator, AGENT_HEARTBEAT_SECONDS
+
+
+# ----- Worker -----
+class Worker:
+    """Runs a TaskCoordinator until asked to stop.
+    
+    Tasks queued in this process wake the worker straight away through a
+    ContextDB listener. Tasks queued by other processes are noticed by
+    ContextDB.poll_changes(), a stat() of the JSON store or SQLite's
+    data_version, checked every poll_interval seconds. A full poll still
+    runs every idle_poll seconds as a safety net. The agents' last_seen is
+    refreshed every heartbeat_interval seconds so that gc_agents() in
+    another process does not remove the idle agents of a running worker.
+    """
+    
+    def __init__(self, context_db, coordinator, poll_interval=0.2, idle_poll=30.0,
+                 heartbeat_interval=AGENT_HEARTBEAT_SECONDS):
+        self.context_db = context_db
+        self.coordinator = coordinator
+        self.poll_interval = poll_interval
+        self.idle_poll = idle_poll
+        self.heartbeat_interval = heartbeat_interval
+        self._loop = None
+        self._wakeup = None
+        self._stopping = False
+        self._cycles = set()
+    
+    def log(self, message):
+        print(f"[{datetime.now().isoformat(timespec='seconds')}] {message}", flush=True)
+    
+    def notify(self):
+        # May be called from any thread that adds a task
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+    
+    def stop(self):
+        """Stop claiming tasks; tasks already running are allowed to finish."""
+        if not self._stopping:
+            self._stopping = True
+            self.coordinator.drain()
+            self.log("Shutting down, waiting for running tasks...")
+            if self._wakeup is not None:
+                self._wakeup.set()
+    
+    async def _watch_store(self):
+        waited = 0.0
+        while not self._stopping:
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+            if self.context_db.poll_changes() or waited >= self.idle_poll:
+                waited = 0.0
+                self._wakeup.set()
+    
+    async def _heartbeat(self):
+        while not self._stopping:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.coordinator.heartbeat_agents()
+            except Exception as e:
+                self.log(f"Agent heartbeat failed: {str(e)}")
+    
+    def _cycle_done(self, cycle):
+        self._cycles.discard(cycle)
+        try:
+            result = cycle.result()
+        except Exception as e:
+            self.log(f"Task coordinator error: {str(e)}")
+            return
+        if result != "No pending tasks.":
+            for line in result.splitlines():
+                self.log(line)
+    
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.context_db.add_listener(self.notify)
+        watcher = asyncio.ensure_future(self._watch_store())
+        heartbeat = asyncio.ensure_future(self._heartbeat())
+        self._wakeup.set()  # pick up whatever is already queued
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if self._stopping:
+                    break
+                # Each cycle runs its tasks and whatever they unblock; cycles
+                # overlap, so a long task never delays new work
+                cycle = asyncio.ensure_future(self.coordinator.process_pending_tasks())
+                self._cycles.add(cycle)
+                cycle.add_done_callback(self._cycle_done)
+            
+            if self._cycles:
+                await asyncio.wait(set(self._cycles))
+        finally:
+            watcher.cancel()
+            heartbeat.cancel()
+            self.context_db.remove_listener(self.notify)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="context.json", help="context database path (.json or .sqlite)")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum tasks running at once")
+    parser.add_argument("--poll-interval", type=float, default=0.2,
+                        help="seconds between checks for tasks added by other processes")
+    args = parser.parse_args()
+    
+    context_db = ContextDB(args.db)
+    coordinator = create_coordinator(context_db, max_concurrency=args.concurrency)
+    worker = Worker(context_db, coordinator, poll_interval=args.poll_interval)
+    
+    loop = asyncio.get_running_loop()
+    
+    def on_signal():
+        worker.stop()
+        # A second Ctrl-C / SIGTERM gets the default behaviour
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+    
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, on_signal)
+    
+    worker.log(f"Worker started on {args.db} ({len(coordinator.agents)} agents, concurrency {args.concurrency})")
+    try:
+        await worker.run()
+    finally:
+        context_db.close()
+    worker.log("Worker stopped.")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))